@@ -0,0 +1,337 @@
+"""API-режим: запросы загрузки и сохранения фото, подсмотренные в сетевом логе Chrome.
+
+Первые SKU сессии проходят через интерфейс; из лога производительности (DevTools)
+берутся запрос загрузки файла и запросы сохранения. Значения, зависящие от SKU и от
+ответа на загрузку, заменяются метками; если шаблоны с разных SKU совпали, дальше те
+же запросы повторяются через HTTP-сессию драйвера. Модуль не зависит от selenium и requests.
+"""
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote, urlsplit
+
+# заголовки, которые requests выставит сам или берёт из своей сессии
+_SKIP_HEADERS = {"host", "content-length", "cookie", "connection", "accept-encoding"}
+_TOKEN_SKU = "\x00sku\x00"
+_TOKEN_SKU_QUOTED = "\x00sku-q\x00"
+# значения из ответа на загрузку короче этого не считаются ссылками на загруженный файл
+_MIN_UPLOAD_VALUE_LEN = 6
+
+
+class UnsafeReplay(ValueError):
+    """Запросы нельзя повторять для других SKU: они затронули бы чужие данные карточки"""
+
+
+@dataclass
+class CapturedRequest:
+    """Запрос из сетевого лога браузера"""
+    request_id: str
+    method: str
+    url: str
+    headers: Dict[str, str]
+    post_data: Optional[str] = None
+    has_post_data: bool = False
+    status: Optional[int] = None
+    response_body: Optional[str] = None
+
+    @property
+    def content_type(self) -> str:
+        return next((v for k, v in self.headers.items() if k.lower() == "content-type"), "")
+
+    @property
+    def ok(self) -> bool:
+        return self.status is not None and 200 <= self.status < 300
+
+
+def parse_performance_log(entries: List[dict]) -> List[CapturedRequest]:
+    """Запросы с телом (не GET/HEAD) из записей driver.get_log("performance") в порядке отправки"""
+    requests_by_id: Dict[str, CapturedRequest] = {}
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        method = message.get("method")
+        params = message.get("params", {})
+        request_id = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            request = params.get("request", {})
+            if request.get("method", "GET").upper() in ("GET", "HEAD", "OPTIONS"):
+                continue
+            requests_by_id[request_id] = CapturedRequest(
+                request_id=request_id,
+                method=request["method"].upper(),
+                url=request.get("url", ""),
+                headers=dict(request.get("headers", {})),
+                post_data=request.get("postData"),
+                has_post_data=bool(request.get("hasPostData") or request.get("postData")),
+            )
+        elif method == "Network.responseReceived" and request_id in requests_by_id:
+            requests_by_id[request_id].status = params.get("response", {}).get("status")
+    return list(requests_by_id.values())
+
+
+def parse_multipart(body: str, content_type: str) -> Tuple[List[Tuple[str, str]], Optional[str]]:
+    """Разбирает multipart/form-data: (текстовые поля, имя поля с файлом или None)"""
+    boundary = None
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary":
+            boundary = value.strip('"')
+    if not boundary:
+        raise ValueError("в Content-Type нет boundary")
+    fields: List[Tuple[str, str]] = []
+    file_field = None
+    for part in body.split("--" + boundary)[1:]:
+        if part.startswith("--"):
+            break
+        head, _, value = part.lstrip("\r\n").partition("\r\n\r\n")
+        disposition = next((line for line in head.split("\r\n") if line.lower().startswith("content-disposition")), "")
+        params = dict(
+            (k.strip().lower(), v.strip().strip('"'))
+            for k, _, v in (p.partition("=") for p in disposition.split(";")[1:])
+        )
+        if "name" not in params:
+            continue
+        if "filename" in params:
+            file_field = params["name"]
+        else:
+            fields.append((params["name"], value[:-2] if value.endswith("\r\n") else value))
+    return fields, file_field
+
+
+def _leaves(data, path=()):
+    """Пары (путь, значение) для всех строк и чисел в JSON"""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from _leaves(value, path + (key,))
+    elif isinstance(data, list):
+        for i, value in enumerate(data):
+            yield from _leaves(value, path + (i,))
+    elif isinstance(data, (str, int, float)) and not isinstance(data, bool):
+        yield path, data
+
+
+def _lookup(data, path):
+    for key in path:
+        data = data[key]
+    return data
+
+
+@dataclass
+class _Slot:
+    """Числовое значение в JSON, вместо которого подставляется SKU или значение из ответа на загрузку"""
+    token: str
+
+
+class _Marker:
+    """Заменяет в значениях SKU и значения из ответа на загрузку метками"""
+
+    def __init__(self, sku: str, upload_values: Dict[Tuple, str]):
+        self.sku = sku
+        self.sku_quoted = quote(sku, safe="")
+        # длинные значения — первыми, чтобы подстрока не разрезала значение целиком
+        self.upload_values = sorted(upload_values.items(), key=lambda kv: -len(kv[1]))
+        self.tokens = {path: f"\x00up{i}\x00" for i, (path, _) in enumerate(self.upload_values)}
+        self.used_upload: Dict[str, Tuple] = {}
+        self.sku_used = False
+
+    def text(self, value: str, url: bool = False) -> str:
+        """Подстроки в адресах, заголовках и теле без структуры; в адрес SKU всегда подставляется экранированным"""
+        for path, needle in self.upload_values:
+            if needle in value:
+                self.used_upload[self.tokens[path]] = path
+                value = value.replace(needle, self.tokens[path])
+        if self.sku in value or self.sku_quoted in value:
+            self.sku_used = True
+            if self.sku_quoted != self.sku or url:
+                value = value.replace(self.sku_quoted, _TOKEN_SKU_QUOTED)
+            value = value.replace(self.sku, _TOKEN_SKU_QUOTED if url else _TOKEN_SKU)
+        return value
+
+    def value(self, value: str) -> str:
+        """Поле формы или JSON — только совпадение целиком: короткий SKU не ищется внутри чисел и дат"""
+        for path, needle in self.upload_values:
+            if value == needle:
+                self.used_upload[self.tokens[path]] = path
+                return self.tokens[path]
+        if value == self.sku:
+            self.sku_used = True
+            return _TOKEN_SKU
+        return value
+
+    def json(self, data):
+        if isinstance(data, dict):
+            return {key: self.json(value) for key, value in data.items()}
+        if isinstance(data, list):
+            return [self.json(value) for value in data]
+        if isinstance(data, str):
+            return self.value(data)
+        if isinstance(data, (int, float)) and not isinstance(data, bool):
+            marked = self.value(str(data))
+            if marked != str(data):
+                return _Slot(marked)
+        return data
+
+
+def _fill_text(value: str, sku: str, upload_values: Dict[str, str]) -> str:
+    for token, new in upload_values.items():
+        value = value.replace(token, new)
+    return value.replace(_TOKEN_SKU_QUOTED, quote(sku, safe="")).replace(_TOKEN_SKU, sku)
+
+
+def _fill_json(data, sku: str, upload_values: Dict[str, str]):
+    if isinstance(data, dict):
+        return {key: _fill_json(value, sku, upload_values) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_fill_json(value, sku, upload_values) for value in data]
+    if isinstance(data, str):
+        return _fill_text(data, sku, upload_values)
+    if isinstance(data, _Slot):
+        value = _fill_text(data.token, sku, upload_values)
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    return data
+
+
+@dataclass
+class RequestTemplate:
+    """Запрос с метками вместо SKU и значений из ответа на загрузку"""
+    method: str
+    url: str
+    headers: Dict[str, str]
+    kind: str  # multipart, json, form, raw
+    fields: List[Tuple[str, str]] = field(default_factory=list)  # multipart и form
+    file_field: Optional[str] = None
+    body: object = None  # json — разобранный JSON с метками, raw — строка
+    response_json: bool = False
+    upload_paths: Dict[str, Tuple] = field(default_factory=dict)  # метка -> путь в ответе на загрузку
+    uses_sku: bool = False  # SKU есть в адресе или теле запроса
+
+    def render(self, sku: str, upload_response=None) -> dict:
+        """Аргументы для requests.Session.request (кроме files) для нового SKU"""
+        values = {}
+        for token, path in self.upload_paths.items():
+            try:
+                values[token] = str(_lookup(upload_response, path))
+            except (KeyError, IndexError, TypeError):
+                raise ValueError(f"в ответе на загрузку нет поля {'.'.join(map(str, path))}")
+        kwargs = {
+            "method": self.method,
+            "url": _fill_text(self.url, sku, values),
+            "headers": {k: _fill_text(v, sku, values) for k, v in self.headers.items()},
+        }
+        if self.kind in ("multipart", "form"):
+            kwargs["data"] = [(k, _fill_text(v, sku, values)) for k, v in self.fields]
+        elif self.kind == "json":
+            kwargs["data"] = json.dumps(_fill_json(self.body, sku, values), ensure_ascii=False).encode("utf-8")
+        elif self.body is not None:
+            kwargs["data"] = _fill_text(self.body, sku, values).encode("utf-8")
+        return kwargs
+
+    def shape(self) -> tuple:
+        """Всё, кроме значений заголовков: у двух SKU должно совпасть, иначе в запросе есть
+        неизвестное значение этой карточки (например, её внутренний id)"""
+        body = json.dumps(self.body, sort_keys=True, default=lambda slot: slot.token)
+        return (self.method, self.url, self.kind, tuple(self.fields), self.file_field, body,
+                tuple(sorted(self.upload_paths.items())), tuple(sorted(self.headers)))
+
+
+def make_template(request: CapturedRequest, sku: str, upload_values: Optional[Dict[Tuple, str]] = None) -> RequestTemplate:
+    """Шаблон из запроса, отправленного для sku; ошибка разбора тела — ValueError"""
+    marker = _Marker(sku, upload_values or {})
+    content_type = request.content_type.lower()
+    if content_type.startswith("multipart/"):
+        kind = "multipart"
+    elif "json" in content_type:
+        kind = "json"
+    elif content_type.startswith("application/x-www-form-urlencoded"):
+        kind = "form"
+    else:
+        kind = "raw"
+    template = RequestTemplate(request.method, marker.text(request.url, url=True), {}, kind)
+    body = request.post_data or ""
+    if kind == "multipart":
+        fields, template.file_field = parse_multipart(body, request.content_type)
+        template.fields = [(k, marker.value(v)) for k, v in fields]
+    elif kind == "form":
+        template.fields = [(k, marker.value(v)) for k, v in parse_qsl(body, keep_blank_values=True)]
+    elif kind == "json":
+        template.body = marker.json(json.loads(body)) if body else None
+    else:
+        template.body = marker.text(body) if body else None
+    template.uses_sku = marker.sku_used
+    # Referer и подобные заголовки тоже содержат SKU, но на адресата запроса не указывают
+    for key, value in request.headers.items():
+        lowered = key.lower()
+        if key.startswith(":") or lowered in _SKIP_HEADERS or (kind == "multipart" and lowered == "content-type"):
+            continue
+        template.headers[key] = marker.text(value, url=True)
+    template.upload_paths = dict(marker.used_upload)
+    try:
+        template.response_json = isinstance(json.loads(request.response_body or ""), (dict, list))
+    except ValueError:
+        template.response_json = False
+    return template
+
+
+def upload_values(response_body: Optional[str]) -> Dict[Tuple, str]:
+    """Значения из JSON-ответа на загрузку, которые могут ссылаться на загруженный файл"""
+    try:
+        data = json.loads(response_body or "")
+    except ValueError:
+        return {}
+    return {path: str(value) for path, value in _leaves(data) if len(str(value)) >= _MIN_UPLOAD_VALUE_LEN}
+
+
+@dataclass
+class ReplayTemplate:
+    """Загрузка файла и следующие за ней запросы сохранения, выученные на одном SKU"""
+    campaign_id: str
+    learned_sku: str
+    upload: RequestTemplate
+    save: List[RequestTemplate]
+
+    def matches(self, other: "ReplayTemplate") -> bool:
+        """Шаблоны с двух разных SKU одной кампании совпадают с точностью до меток"""
+        return (
+            self.campaign_id == other.campaign_id and self.learned_sku != other.learned_sku
+            and self.upload.shape() == other.upload.shape()
+            and [t.shape() for t in self.save] == [t.shape() for t in other.save]
+        )
+
+
+def _same_site(url: str, page_url: str) -> bool:
+    return urlsplit(url).netloc == urlsplit(page_url).netloc
+
+
+def build_replay_template(campaign_id: str, sku: str, page_url: str, upload: List[CapturedRequest],
+                          save: List[CapturedRequest], card_pictures: List[str]) -> ReplayTemplate:
+    """Собирает шаблон из запросов, пойманных при загрузке и при сохранении; нельзя — ValueError"""
+    uploads = [r for r in upload if r.ok and r.content_type.lower().startswith("multipart/")]
+    if not uploads:
+        raise ValueError("не найден успешный multipart-запрос загрузки файла")
+    upload_request = uploads[-1]
+    upload_template = make_template(upload_request, sku)
+    if not upload_template.file_field:
+        raise ValueError("в запросе загрузки не найдено поле с файлом (тело запроса недоступно)")
+    uploaded = upload_values(upload_request.response_body)
+
+    steps = []
+    for request in save:
+        if not request.ok or not _same_site(request.url, page_url) or request.content_type.lower().startswith("multipart/"):
+            continue
+        text = " ".join([request.url, request.post_data or ""])
+        for picture in card_pictures:
+            # тело со списком фото этой карточки для другого SKU затёрло бы его фото
+            path = urlsplit(picture).path
+            if picture in text or (path and len(path) > 1 and path in text):
+                raise UnsafeReplay("запрос сохранения содержит список фото карточки — повторять его нельзя")
+        template = make_template(request, sku, uploaded)
+        if template.uses_sku:
+            steps.append(template)
+    if not steps:
+        raise ValueError("не найдено запросов сохранения, ссылающихся на SKU")
+    return ReplayTemplate(campaign_id, sku, upload_template, steps)
@@ -0,0 +1,94 @@
+"""Сквозной прогон пакетной обработки на локальном стенде кабинета (benchmarks/mock_partner.py).
+
+Поднимает стенд, запускает настоящий Chrome через YandexMarketPhotoReloaderDriver и
+BatchRunner на --skus сгенерированных SKU и печатает SKU/мин, итог по SKU, разбивку
+времени по этапам и счётчики запросов стенда. БД, cookies и профили Chrome — во
+временной папке, рабочие файлы программы не трогаются.
+
+Запуск: python benchmarks/bench_mock_batch.py [--skus 30] [--workers 2] [--prefetch 3]
+        [--latency 0.2] [--api-latency 0.5] [--captcha-rate 0.05] [--fail-rate 0.02] [--asset-latency 1.0]
+        [--api-mode] [--perf-profile] [--show]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_partner import BUSINESSES, MockPartnerServer  # noqa: E402
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--skus", type=int, default=30)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--prefetch", type=int, default=0)
+    ap.add_argument("--latency", type=float, default=0.2, help="задержка страниц стенда, с")
+    ap.add_argument("--api-latency", type=float, default=0.5, help="задержка загрузки и сохранения, с")
+    ap.add_argument("--captcha-rate", type=float, default=0.0)
+    ap.add_argument("--captcha-clear", type=float, default=2.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="доля 503 на карточку (временная ошибка: ждёт DEFAULT_WAIT, SKU откладывается)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--asset-latency", type=float, default=0.0, help="задержка шрифта и счётчика, с")
+    ap.add_argument("--perf-profile", action="store_true", help="облегчённая загрузка страниц (PERF_BLOCKED_URLS, eager)")
+    ap.add_argument("--api-mode", action="store_true", help="загрузка и сохранение повтором запросов (api_replay.py)")
+    ap.add_argument("--show", action="store_true", help="Chrome с окном (по умолчанию headless)")
+    ap.add_argument("-v", "--verbose", action="store_true", help="печатать лог обработки")
+    args = ap.parse_args()
+
+    server = MockPartnerServer(
+        latency=args.latency, api_latency=args.api_latency, captcha_rate=args.captcha_rate,
+        captcha_clear=args.captcha_clear, fail_rate=args.fail_rate, asset_latency=args.asset_latency, seed=args.seed,
+    ).start()
+    # адрес стенда должен быть задан до создания драйвера: профиль собирается один раз
+    os.environ["YM_PARTNER_BASE_URL"] = server.base_url
+    from browser import YandexMarketPhotoReloaderDriver
+    from runner import BatchRunner
+    from storage import Storage
+
+    log = print if args.verbose else (lambda msg: None)
+    campaign_id = BUSINESSES[0][2]
+    skus = [f"MOCK-{i:05d}" for i in range(1, args.skus + 1)]
+    headless = not args.show
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        storage = Storage(os.path.join(work, "bench.sqlite3"))
+        driver = YandexMarketPhotoReloaderDriver(log, headless=headless, api_mode=args.api_mode,
+                                                 perf_profile=args.perf_profile)
+        try:
+            driver.start()
+            driver.open_home()
+            runner = BatchRunner(
+                driver, storage, campaign_id, skus, skip_processed=False,
+                pool_size=args.workers, prefetch_depth=args.prefetch, headless=headless,
+                log_fn=log, captcha_fn=lambda msg: log(f"капча: {msg}"),
+            )
+            started = time.monotonic()
+            runner.run()
+            elapsed = time.monotonic() - started
+        finally:
+            driver.stop()
+            storage.close()
+            server.stop()
+            os.chdir(cwd)
+
+    rate = (runner.succeeded + runner.failed) * 60 / elapsed if elapsed > 0 else 0.0
+    print(f"SKU: {len(skus)}, сессий: {args.workers}, предзагрузка: {args.prefetch}, "
+          f"задержки стенда: страница {args.latency} с, API {args.api_latency} с"
+          f"{', API-режим' if args.api_mode else ''}{', облегчённые страницы' if args.perf_profile else ''}")
+    print(f"успешно {runner.succeeded}, не удалось {runner.failed}; {elapsed:.1f} с, {rate:.1f} SKU/мин")
+    if runner.stats.count:
+        print(runner.stats.phase_summary())
+    print("стенд:", json.dumps(server.counters, ensure_ascii=False))
+    return 0 if runner.succeeded + runner.failed == len(skus) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
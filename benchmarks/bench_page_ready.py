@@ -0,0 +1,94 @@
+"""Время готовности карточки товара с облегчённым профилем загрузки и без него.
+
+На локальном стенде (benchmarks/mock_partner.py) по очереди запускается Chrome в обычном
+режиме и с perf_profile (pageLoadStrategy=eager + блокировка PERF_BLOCKED_URLS), каждый
+открывает одни и те же --cards карточек. Готовность страницы — этапы «переход»
+(driver.get) и «превью» (ожидание превью) из YandexMarketPhotoReloaderDriver, как при
+обработке. Печатает средние по этапам для обоих режимов и выигрыш.
+
+Запуск: python benchmarks/bench_page_ready.py [--cards 20] [--latency 0.2] [--asset-latency 1.0] [--show]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_partner import BUSINESSES, MockPartnerServer  # noqa: E402
+
+READY_PHASES = ("navigate", "thumbnails")
+
+
+def measure(perf_profile: bool, campaign_id: str, skus, headless: bool, log) -> dict:
+    """Средние времена этапов READY_PHASES по карточкам skus, с"""
+    from browser import CaptchaError, SkuFailed, YandexMarketPhotoReloaderDriver
+
+    driver = YandexMarketPhotoReloaderDriver(log, headless=headless, perf_profile=perf_profile)
+    samples = {phase: [] for phase in READY_PHASES}
+    try:
+        driver.start()
+        driver.open_home()
+        # первая карточка — прогрев браузера, в замер не идёт
+        for i, sku in enumerate([skus[0]] + list(skus)):
+            driver.sku_timings.clear()
+            try:
+                driver._open_pictures_modal(campaign_id, sku, log)
+            except (SkuFailed, CaptchaError) as e:
+                log(f"[{sku}] {e}")
+                continue
+            if i:
+                for phase in READY_PHASES:
+                    samples[phase].append(driver.sku_timings.get(phase, 0.0))
+    finally:
+        driver.stop()
+    return {phase: statistics.mean(values) if values else 0.0 for phase, values in samples.items()}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cards", type=int, default=20)
+    ap.add_argument("--latency", type=float, default=0.2, help="задержка страниц стенда, с")
+    ap.add_argument("--asset-latency", type=float, default=1.0, help="задержка шрифта и счётчика, с")
+    ap.add_argument("--image-kb", type=int, default=200)
+    ap.add_argument("--show", action="store_true", help="Chrome с окном (по умолчанию headless)")
+    ap.add_argument("-v", "--verbose", action="store_true", help="печатать лог драйвера")
+    args = ap.parse_args()
+
+    server = MockPartnerServer(latency=args.latency, asset_latency=args.asset_latency, image_kb=args.image_kb).start()
+    # адрес стенда должен быть задан до создания драйвера: профиль собирается один раз
+    os.environ["YM_PARTNER_BASE_URL"] = server.base_url
+    log = print if args.verbose else (lambda msg: None)
+    campaign_id = BUSINESSES[0][2]
+    skus = [f"MOCK-{i:05d}" for i in range(1, args.cards + 1)]
+
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work:
+        os.chdir(work)
+        try:
+            for perf_profile in (False, True):
+                results[perf_profile] = measure(perf_profile, campaign_id, skus, not args.show, log)
+        finally:
+            server.stop()
+            os.chdir(cwd)
+
+    from config import PHASE_TITLES
+
+    print(f"Карточек: {len(skus)}, задержка страницы {args.latency} с, шрифта и счётчика {args.asset_latency} с")
+    for perf_profile, title in ((False, "обычный"), (True, "облегчённый")):
+        phases = results[perf_profile]
+        parts = ", ".join(f"{PHASE_TITLES[p]} {phases[p]:.2f} с" for p in READY_PHASES)
+        print(f"{title:>12}: готовность {sum(phases.values()):.2f} с ({parts})")
+    before, after = sum(results[False].values()), sum(results[True].values())
+    if before > 0:
+        print(f"выигрыш: {before - after:.2f} с на карточку ({(before - after) * 100 / before:.0f}%)")
+    print("стенд:", server.counters)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Бенчмарк времени запуска окна программы.
+
+Замеряет в отдельном процессе время от старта интерпретатора до показа MainWindow
+(QT_QPA_PLATFORM=offscreen) и проверяет, что тяжёлые зависимости (pandas, openpyxl,
+selenium) при этом не импортированы. Код возврата 1, если медиана превышает бюджет.
+
+Запуск: python benchmarks/bench_startup.py [--runs 5] [--budget 1.0]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl", "selenium", "requests")
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+from PyQt5 import QtWidgets
+import yandex_partner_reuploader
+app = QtWidgets.QApplication(sys.argv)
+win = yandex_partner_reuploader.MainWindow()
+win.show()
+app.processEvents()
+elapsed = time.perf_counter() - t0
+heavy = [m for m in %r if m in sys.modules]
+win.storage.close()
+print(json.dumps({"elapsed": elapsed, "heavy": heavy}))
+""" % (HEAVY_MODULES,)
+
+
+def run_once() -> dict:
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"), PYTHONPATH=ROOT)
+    # отдельная рабочая папка, чтобы не трогать processed_items.sqlite3 пользователя
+    with tempfile.TemporaryDirectory() as cwd:
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=cwd, env=env, capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget", type=float, default=1.0, help="допустимая медиана, с")
+    args = ap.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    times = [r["elapsed"] for r in results]
+    heavy = sorted({m for r in results for m in r["heavy"]})
+    median = statistics.median(times)
+    print(f"запусков: {args.runs}, медиана {median:.3f} с, мин {min(times):.3f} с, макс {max(times):.3f} с")
+    if heavy:
+        print(f"при старте импортированы тяжёлые модули: {', '.join(heavy)}")
+    if median > args.budget or heavy:
+        print(f"ПРЕВЫШЕН бюджет {args.budget:.2f} с или есть лишние импорты")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Бенчмарк разбора выгрузки «Остатки на складе» с объединёнными ячейками.
+
+Генерирует файлы с разным числом строк и объединённых диапазонов (в шапке над
+таблицей и в строках данных, колонки данных заполнены через одну, как в реальной
+выгрузке) и замеряет разбор целиком:
+  - load_xlsx_skus — обычный путь (потоковое чтение open_xlsx_skus и очистка SKU);
+  - полный DOM листа с индексом build_merged_index — запасной путь, когда колонка
+    SKU в потоковом режиме не найдена.
+
+Запуск: python benchmarks/bench_xlsx_merged.py [--rows 1000 5000 10000] [--merged 10 100 500]
+"""
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser import _iter_skus_with_merged_cells, load_xlsx_skus  # noqa: E402
+
+COLS = 12
+HEADER_ROW = 7
+
+
+def make_file(path: str, rows: int, merged_ranges: int):
+    wb = Workbook()
+    ws = wb.active
+    ws["B3"] = "ID кабинета 123456"
+    for col in range(1, COLS + 1):
+        ws.cell(row=HEADER_ROW, column=col, value=f"Колонка {col}")
+    ws.cell(row=HEADER_ROW, column=1, value="Ваш SKU *")
+    for r in range(HEADER_ROW + 1, HEADER_ROW + 1 + rows):
+        ws.cell(row=r, column=1, value=f"SKU-{r}")
+        # как в реальной выгрузке: часть колонок пустая
+        for col in range(2, COLS + 1, 2):
+            ws.cell(row=r, column=col, value=r * col)
+    # Объединённые диапазоны 1x2: сначала заполняем шапку над таблицей, остальные — в строках данных
+    pairs_per_row = (COLS - 2) // 2
+    header_slots = (HEADER_ROW - 1) * pairs_per_row
+    for i in range(merged_ranges):
+        if i < header_slots:
+            row = 1 + i // pairs_per_row
+        else:
+            row = HEADER_ROW + 1 + (i - header_slots)
+        col = 2 + 2 * (i % pairs_per_row)
+        ws.merge_cells(start_row=row, start_column=col, end_row=row, end_column=col + 1)
+    wb.save(path)
+
+
+def bench(path: str, rows: int):
+    t0 = time.perf_counter()
+    _, skus, _ = load_xlsx_skus(path)
+    streaming = time.perf_counter() - t0
+    assert len(skus) == rows, (len(skus), rows)
+
+    t0 = time.perf_counter()
+    _, _, values = _iter_skus_with_merged_cells(path, HEADER_ROW)
+    count = sum(1 for v in itertools.takewhile(lambda v: v, values))
+    full_dom = time.perf_counter() - t0
+    assert count == rows, (count, rows)
+    return streaming, full_dom
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[1_000, 5_000, 10_000])
+    ap.add_argument("--merged", type=int, nargs="+", default=[10, 100, 500])
+    args = ap.parse_args()
+
+    import pandas  # noqa: F401  — импорт (~0,3 с) не относится к разбору, делаем его до замеров
+
+    print(f"{'строк':>8} {'диапазонов':>11} {'потоково, с':>12} {'полный DOM, с':>14}")
+    with tempfile.TemporaryDirectory() as work:
+        for rows in args.rows:
+            for merged_ranges in args.merged:
+                path = os.path.join(work, f"stocks_{rows}_{merged_ranges}.xlsx")
+                make_file(path, rows, merged_ranges)
+                streaming, full_dom = bench(path, rows)
+                print(f"{rows:>8} {merged_ranges:>11} {streaming:>12.3f} {full_dom:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
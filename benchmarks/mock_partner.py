@@ -0,0 +1,326 @@
+"""Локальный стенд кабинета партнёра Яндекс Маркета для прогонов без реального аккаунта.
+
+Отдаёт страницы с теми же селекторами, на которые опирается YandexMarketPhotoReloaderDriver:
+список бизнесов (main-redirect), страницу бизнеса со ссылкой showcase?campaignId=...,
+карточку товара с превью, модалку с картинками, input[type=file], кнопкой «Сохранить»
+и уведомлением. Загрузка и сохранение идут fetch-запросами к /api/upload-picture и
+/api/save-offer, как в настоящем кабинете.
+
+Как и настоящий кабинет, страницы тянут шрифт (/fonts/) и счётчик (/metrika/tag.js) —
+они отвечают с задержкой --asset-latency и держат событие load, не мешая работе страницы.
+
+Задержки, доля капч и доля ошибок настраиваются. Капча — редирект на /showcaptcha,
+которая сама «решается» через --captcha-clear секунд и возвращает на карточку.
+
+Запуск отдельно (для GUI или CLI с YM_PARTNER_BASE_URL=http://127.0.0.1:8765):
+    python benchmarks/mock_partner.py --port 8765 --latency 0.2 --captcha-rate 0.05
+"""
+import argparse
+import base64
+import html
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, quote, urlsplit
+
+BUSINESSES = [("1001", "Тестовый магазин", "2001"), ("1002", "Второй магазин", "2002")]
+PICTURES_PER_CARD = 3
+
+# PNG 1x1; хвост после IEND браузеры игнорируют — им добиваем размер до --image-kb
+_PNG_1X1 = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+
+_PAGE = """<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>{title}</title>
+<script async src="/metrika/tag.js"></script>
+<style>
+@font-face {{ font-family: "YS Text"; src: url(/fonts/ys-text.woff2) format("woff2"); }}
+body {{ font-family: "YS Text", sans-serif; margin: 20px; }}
+.styles-picture___6gWHl {{ width: 120px; height: 120px; margin: 4px; cursor: pointer; background: #ddd; }}
+.___wrapper___7pLKs {{ position: fixed; top: 40px; right: 40px; width: 480px; padding: 16px;
+                      background: #fff; border: 1px solid #888; }}
+.style-main___6BATS {{ width: 96px; height: 96px; margin: 4px; background: #eee; }}
+[role=alert] {{ position: fixed; bottom: 20px; left: 20px; padding: 8px; background: #cfc; }}
+</style></head>
+<body>{body}</body></html>
+"""
+
+_OFFER_CARD = """
+<h1>Карточка товара {article}</h1>
+<div class="offer-documents">Документы: <input type="file" name="documents"></div>
+<div class="offer-pictures">{thumbs}</div>
+<button data-e2e="next-step-button" type="button">Сохранить</button>
+<script>
+const ARTICLE = {article_json};
+const PICTURES = {pictures_json};
+
+function bigImage(src) {{
+  const img = document.createElement('img');
+  img.className = 'style-root___17qgj style-main___6BATS';
+  img.setAttribute('data-testid', 'loaded-image');
+  img.src = src;
+  return img;
+}}
+
+function openDrawer() {{
+  if (document.querySelector('.style-picturesDrawer___55UwA')) return;
+  const drawer = document.createElement('div');
+  drawer.className = '___wrapper___7pLKs style-picturesDrawer___55UwA';
+  const close = document.createElement('span');
+  close.setAttribute('aria-label', 'Закрыть');
+  close.textContent = '✕';
+  close.addEventListener('click', () => drawer.remove());
+  const gallery = document.createElement('div');
+  PICTURES.forEach(src => gallery.appendChild(bigImage(src)));
+  const add = document.createElement('span');
+  add.className = '___content___2ml2l';
+  add.textContent = 'Добавить фото';
+  const input = document.createElement('input');
+  input.type = 'file';
+  input.accept = 'image/*';
+  input.addEventListener('change', async () => {{
+    if (!input.files.length) return;
+    const busy = document.createElement('div');
+    busy.setAttribute('role', 'progressbar');
+    busy.textContent = 'Загрузка…';
+    drawer.appendChild(busy);
+    const form = new FormData();
+    form.append('article', ARTICLE);
+    form.append('file', input.files[0]);
+    try {{
+      const resp = await fetch('/api/upload-picture', {{method: 'POST', body: form}});
+      if (resp.ok) {{
+        const data = await resp.json();
+        gallery.appendChild(bigImage(data.url));
+      }}
+    }} finally {{
+      busy.remove();
+      input.value = '';
+    }}
+  }});
+  drawer.append(close, gallery, add, input);
+  document.body.appendChild(drawer);
+}}
+
+document.querySelectorAll('.styles-picture___6gWHl').forEach(img => img.addEventListener('click', openDrawer));
+
+document.querySelector("button[data-e2e='next-step-button']").addEventListener('click', async () => {{
+  const resp = await fetch('/api/save-offer', {{
+    method: 'POST', headers: {{'Content-Type': 'application/json'}}, body: JSON.stringify({{article: ARTICLE}})
+  }});
+  const toast = document.createElement('div');
+  toast.setAttribute('role', 'alert');
+  toast.dataset.e2e = resp.ok ? 'notification-success' : 'notification-error';
+  toast.textContent = resp.ok ? 'Изменения сохранены' : 'Не удалось сохранить';
+  document.body.appendChild(toast);
+  setTimeout(() => toast.remove(), 3000);
+}});
+</script>
+"""
+
+_CAPTCHA = """
+<form class="CheckboxCaptcha" action="/checkcaptcha"><label><input type="checkbox"> Я не робот</label></form>
+<script>setTimeout(() => location.replace({retpath_json}), {clear_ms});</script>
+"""
+
+
+class MockPartnerServer(ThreadingHTTPServer):
+    """HTTP-сервер стенда; настройки и счётчики запросов — атрибуты сервера"""
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency: float = 0.0, api_latency: float = 0.0,
+                 captcha_rate: float = 0.0, captcha_clear: float = 2.0, fail_rate: float = 0.0,
+                 image_kb: int = 200, asset_latency: float = 0.0, seed: Optional[int] = None):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.api_latency = api_latency
+        self.asset_latency = asset_latency
+        self.captcha_rate = captcha_rate
+        self.captcha_clear = captcha_clear
+        self.fail_rate = fail_rate
+        self.image = _PNG_1X1 + b"\0" * max(0, image_kb * 1024 - len(_PNG_1X1))
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = {"pages": 0, "captchas": 0, "failures": 0, "images": 0, "assets": 0,
+                                         "uploads": 0, "saves": 0}
+        self._captcha_seen = set()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockPartnerServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-partner", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, name: str):
+        with self.lock:
+            self.counters[name] += 1
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+    def captcha_once(self, key: str) -> bool:
+        """Капча по --captcha-rate, но не чаще одного раза на ключ — иначе возврат с капчи зациклится"""
+        with self.lock:
+            if key in self._captcha_seen or not (self.captcha_rate > 0 and self.random.random() < self.captcha_rate):
+                return False
+            self._captcha_seen.add(key)
+            self.counters["captchas"] += 1
+            return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: MockPartnerServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---- ответы ----
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _page(self, title: str, body: str, status: int = 200, headers: Optional[Dict[str, str]] = None):
+        time.sleep(self.server.latency)
+        self.server.count("pages")
+        page = _PAGE.format(title=html.escape(title), body=body).encode("utf-8")
+        self._send(status, page, "text/html; charset=utf-8", headers)
+
+    def _json(self, data, status: int = 200):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json")
+
+    def _redirect(self, location: str):
+        self._send(302, b"", "text/plain", {"Location": location})
+
+    # ---- маршруты ----
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = [p for p in url.path.split("/") if p]
+
+        if not parts:
+            return self._page("Маркет для продавцов", "<h1>Кабинет</h1>",
+                              headers={"Set-Cookie": "Session_id=mock; Path=/"})
+        if parts == ["main-redirect"]:
+            return self._page("Мои бизнесы", self._business_list())
+        if parts == ["showcaptcha"]:
+            retpath = query.get("retpath", ["/"])[0]
+            body = _CAPTCHA.format(retpath_json=json.dumps(retpath), clear_ms=int(self.server.captcha_clear * 1000))
+            return self._page("Captcha — Яндекс", body)
+        if parts[0] == "business" and len(parts) >= 2:
+            return self._business(parts[1], parts[2:])
+        if parts[0] == "supplier" and parts[2:] == ["assortment", "offer-card"]:
+            return self._offer_card(parts[1], query.get("article", [""])[0])
+        if parts[0] == "images":
+            self.server.count("images")
+            return self._send(200, self.server.image, "image/png")
+        if parts[0] in ("fonts", "metrika"):
+            # шрифт и счётчик: медленные и ненужные для работы страницы
+            time.sleep(self.server.asset_latency)
+            self.server.count("assets")
+            content_type = "font/woff2" if parts[0] == "fonts" else "application/javascript"
+            return self._send(200, b"", content_type, {"Cache-Control": "no-store"})
+        self._send(404, b"not found", "text/plain")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        time.sleep(self.server.api_latency)
+        if self.path == "/api/upload-picture":
+            self.server.count("uploads")
+            with self.server.lock:
+                n = self.server.counters["uploads"]
+            return self._json({"url": f"/images/uploaded-{n}.png"})
+        if self.path == "/api/save-offer":
+            self.server.count("saves")
+            return self._json({"status": "OK"})
+        self._json({"error": "not found"}, status=404)
+
+    def _business_list(self) -> str:
+        cards = "".join(
+            f"""<div data-e2e="business-card-wrapper">
+                  <span data-e2e="business-card-name">{html.escape(name)}</span>
+                  <span>ID <span data-e2e="business-id">{bid}</span></span>
+                  <a href="/business/{bid}/dashboard?view=marketplace">Перейти</a>
+                </div>"""
+            for bid, name, _ in BUSINESSES
+        )
+        return f'<div data-e2e="business-list">{cards}</div>'
+
+    def _business(self, business_id: str, rest):
+        campaign_id = next((cid for bid, _, cid in BUSINESSES if bid == business_id), None)
+        if campaign_id is None:
+            return self._page("Не найдено", "<h1>Бизнес не найден</h1>", status=404)
+        if rest[:1] == ["settings"]:
+            return self._page("Настройки", f"<h1>Настройки бизнеса {business_id}</h1>")
+        link = f'<a href="/business/{business_id}/showcase?campaignId={campaign_id}">Витрина</a>'
+        return self._page("Бизнес", f"<h1>Бизнес {business_id}</h1>{link}")
+
+    def _offer_card(self, campaign_id: str, article: str):
+        if self.server.captcha_once(f"{campaign_id}/{article}"):
+            return self._redirect(f"/showcaptcha?retpath={quote(self.path, safe='')}")
+        if self.server.roll(self.server.fail_rate):
+            self.server.count("failures")
+            return self._page("Ошибка", "<h1>Сервис временно недоступен</h1>", status=503)
+        key = quote(article, safe="")
+        pictures = [f"/images/{key}-{i}.png" for i in range(1, PICTURES_PER_CARD + 1)]
+        thumbs = "".join(
+            f'<span class="styles-layout___1YRjC"><img class="styles-picture___6gWHl" src="{src}"></span>'
+            for src in pictures
+        )
+        body = _OFFER_CARD.format(
+            article=html.escape(article), article_json=json.dumps(article),
+            pictures_json=json.dumps(pictures), thumbs=thumbs,
+        )
+        self._page(f"Карточка {article}", body)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Локальный стенд кабинета партнёра")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="задержка ответа страницы, с")
+    ap.add_argument("--api-latency", type=float, default=0.0, help="задержка загрузки и сохранения, с")
+    ap.add_argument("--captcha-rate", type=float, default=0.0, help="доля карточек, открывающихся через капчу")
+    ap.add_argument("--captcha-clear", type=float, default=2.0, help="через сколько секунд капча «решается»")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="доля ответов 503 на карточку")
+    ap.add_argument("--image-kb", type=int, default=200, help="размер отдаваемых картинок")
+    ap.add_argument("--asset-latency", type=float, default=0.0, help="задержка шрифта и счётчика, с")
+    args = ap.parse_args()
+
+    server = MockPartnerServer(
+        ("127.0.0.1", args.port), latency=args.latency, api_latency=args.api_latency,
+        captcha_rate=args.captcha_rate, captcha_clear=args.captcha_clear, fail_rate=args.fail_rate,
+        image_kb=args.image_kb, asset_latency=args.asset_latency,
+    )
+    print(f"Стенд запущен: {server.base_url} (YM_PARTNER_BASE_URL={server.base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.counters, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
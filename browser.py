@@ -0,0 +1,1043 @@
+"""Selenium-обёртка над кабинетом партнёра Яндекс Маркета.
+
+Модуль тянет selenium и requests, поэтому GUI импортирует его только при запуске браузера.
+"""
+import base64
+import functools
+import hashlib
+import mimetypes
+import os
+import pickle
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
+from selenium.webdriver.common.action_chains import ActionChains
+
+from api_replay import CapturedRequest, ReplayTemplate, UnsafeReplay, build_replay_template, parse_performance_log
+from config import (
+    API_LEARN_SAMPLES, API_MODE, API_REPLAY_MAX_FAILURES, COOKIE_SYNC_INTERVAL, COOKIES_FILE, DEFAULT_WAIT,
+    DOWNLOAD_CHUNK_SIZE, HTTP_POOL_SIZE, HTTP_RETRIES, LEGACY_FIXED_WAIT, MAX_IMAGE_BYTES, PERF_BLOCKED_URLS,
+    PERF_KEEP_HOSTS, PERF_PROFILE, RETRY_COUNT, SAVE_TIMEOUT, SELF_CHECK_MAX_CARDS, SELF_CHECK_TIMEOUT,
+    SKU_RESULT_CAPTCHA, SKU_RESULT_PERMANENT, SKU_RESULT_SUCCESS, SKU_RESULT_TRANSIENT, SPOOL_MAX_BYTES, SPOOL_RESERVE_STEP,
+    UPLOAD_TIMEOUT, WAIT_POLL_INTERVAL,
+)
+from storage import Cabinet
+from ui_profile import get_ui_profile
+
+
+def get_chrome_version():
+    """Определяем версию установленного Chrome"""
+    try:
+        # Для Windows
+        process = subprocess.run(
+            r'reg query "HKEY_CURRENT_USER\Software\Google\Chrome\BLBeacon" /v version',
+            capture_output=True, text=True, shell=True
+        )
+        output = process.stdout
+        if "version" in output.lower():
+            return output.strip().split()[-1]
+    except Exception as e:
+        print(f"Не удалось получить версию Chrome: {e}")
+    return None
+
+
+def download_chromedriver(chrome_version, driver_dir):
+    """Скачиваем chromedriver под версию Chrome"""
+    major_version = chrome_version.split(".")[0]
+
+    # Узнаем последнюю совместимую версию драйвера
+    url = f"https://chromedriver.storage.googleapis.com/LATEST_RELEASE_{major_version}"
+    response = requests.get(url)
+    driver_version = response.text.strip()
+
+    # Скачиваем zip с драйвером
+    zip_url = f"https://chromedriver.storage.googleapis.com/{driver_version}/chromedriver_win32.zip"
+    zip_path = os.path.join(driver_dir, "chromedriver.zip")
+
+    print(f"Скачиваю ChromeDriver {driver_version}...")
+    with open(zip_path, "wb") as f:
+        f.write(response.content)
+
+    # Распаковываем
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        zip_ref.extractall(driver_dir)
+    os.remove(zip_path)
+
+
+def get_driver(profile_dir: Optional[str] = None, headless: bool = False, capture_network: bool = False,
+               eager: bool = False):
+    """Возвращает Selenium WebDriver с автоскачиванием chromedriver"""
+    # if getattr(sys, 'frozen', False):  # exe через PyInstaller
+    #     base_path = os.path.dirname(sys.executable)
+    # else:
+    #     base_path = os.path.dirname(os.path.abspath(__file__))
+    #
+    # driver_dir = os.path.join(base_path, "drivers")
+    # os.makedirs(driver_dir, exist_ok=True)
+    #
+    # driver_path = os.path.join(driver_dir, "chromedriver.exe")
+    #
+    # if not os.path.exists(driver_path):
+    #     chrome_version = get_chrome_version()
+    #     if not chrome_version:
+    #         raise RuntimeError("Не удалось определить версию Chrome")
+    #     download_chromedriver(chrome_version, driver_dir)
+
+    # service = Service(driver_path)
+    options = Options()
+    options.add_argument("--start-maximized")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    if profile_dir:
+        # отдельный профиль Chrome для каждой сессии пула
+        options.add_argument(f"--user-data-dir={os.path.abspath(profile_dir)}")
+    if headless:
+        # без окна капчу решить нельзя — только для запусков, где капчи не ожидается
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+    if eager:
+        # driver.get возвращается по DOMContentLoaded, не дожидаясь картинок, шрифтов и счётчиков;
+        # нужные элементы всё равно ждём явно
+        options.page_load_strategy = "eager"
+    if capture_network:
+        # сетевой лог DevTools: по нему API-режим находит запросы загрузки и сохранения
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    # return webdriver.Chrome(service=service, options=options)
+    return webdriver.Chrome(options=options)
+
+
+def _url_pattern_matches(pattern: str, url: str) -> bool:
+    """Совпадение адреса с шаблоном Network.setBlockedURLs (* — любая строка)"""
+    return re.fullmatch(".*".join(re.escape(part) for part in pattern.split("*")), url, re.DOTALL) is not None
+
+
+def _pattern_host(pattern: str) -> Optional[str]:
+    """Хост шаблона вида схема://хост/путь (может содержать *); None — хост не задан"""
+    scheme, sep, rest = pattern.partition("://")
+    if not sep or "/" in scheme:
+        return None
+    return rest.split("/", 1)[0]
+
+
+@functools.lru_cache(maxsize=None)
+def blocked_url_patterns(cabinet_url: str, keep: Tuple[str, ...] = ()) -> Tuple[str, ...]:
+    """PERF_BLOCKED_URLS для кабинета cabinet_url без шаблонов, которые могут задеть хост из
+    PERF_KEEP_HOSTS (хост не задан или совпадает с ним) или адрес из keep"""
+    cabinet = urlsplit(cabinet_url).netloc
+    patterns = []
+    for pattern in PERF_BLOCKED_URLS:
+        pattern = pattern.replace("{cabinet}", cabinet)
+        host = _pattern_host(pattern)
+        if host is None or any(_url_pattern_matches(host, kept) for kept in PERF_KEEP_HOSTS):
+            continue
+        if not any(_url_pattern_matches(pattern, url) for url in keep):
+            patterns.append(pattern)
+    return tuple(patterns)
+
+
+# ======================
+# Selenium driver wrapper
+# ======================
+# Адреса и селекторы — в профиле (config.UI_PROFILES, ui_profile.py)
+
+# Капча: адрес страницы, заголовок или элемент формы капчи — без сериализации всего DOM
+_JS_IS_CAPTCHA = """
+const url = location.href.toLowerCase();
+if (url.includes('showcaptcha') || url.includes('/captcha')) return true;
+if ((document.title || '').toLowerCase().includes('captcha')) return true;
+return !!document.querySelector(arguments[0]);
+"""
+
+# Загрузка завершена: в модалке стало больше загруженных картинок и нет индикатора прогресса
+_JS_UPLOAD_DONE = """
+const modal = document.querySelector(arguments[0]);
+if (!modal) return false;
+const loaded = modal.querySelectorAll(arguments[3]).length;
+return loaded > arguments[1] && !modal.querySelector(arguments[2]);
+"""
+
+# Перед кликом «Сохранить»: перехват fetch/XHR, чтобы видеть метод и окончание запросов
+# (resource timing метода не знает), и число уже показанных уведомлений
+_JS_SAVE_PREPARE = """
+if (!window.__ymWrites) {
+    window.__ymWrites = [];
+    const track = (method, url) => {
+        const entry = {method: String(method || 'GET').toUpperCase(), url: new URL(String(url), location.href).href,
+                       t: performance.now(), done: false, status: 0};
+        if (entry.method !== 'GET' && entry.method !== 'HEAD') window.__ymWrites.push(entry);
+        return entry;
+    };
+    const fetch = window.fetch;
+    window.fetch = function (input, init) {
+        const entry = track((init && init.method) || (input && input.method),
+                            typeof input === 'string' ? input : (input && input.url) || input);
+        const result = fetch.apply(this, arguments);
+        result.then(r => { entry.status = r.status; entry.done = true; }, () => { entry.done = true; });
+        return result;
+    };
+    const open = XMLHttpRequest.prototype.open, send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.open = function (method, url) {
+        this.__ymRequest = [method, url];
+        return open.apply(this, arguments);
+    };
+    XMLHttpRequest.prototype.send = function () {
+        if (this.__ymRequest) {
+            const entry = track(this.__ymRequest[0], this.__ymRequest[1]);
+            this.addEventListener('loadend', () => { entry.status = this.status; entry.done = true; });
+        }
+        return send.apply(this, arguments);
+    };
+}
+return [document.querySelectorAll(arguments[0]).length, performance.now()];
+"""
+
+# Сохранение завершено: по изменяющим запросам (не GET) того же origin, начатым после клика, —
+# первый неудачный сразу, иначе когда завершились все; опросы и heartbeat-запросы — GET и не
+# считаются. Уведомление об успехе — только если таких запросов не видно (не через fetch/XHR)
+_JS_SAVE_DONE = """
+const since = arguments[2];
+const writes = (window.__ymWrites || []).filter(e => e.t >= since && e.url.startsWith(location.origin + '/'));
+const failed = writes.find(e => e.done && !(e.status >= 200 && e.status < 400));
+if (failed) return {status: failed.status};
+if (writes.length) return writes.every(e => e.done) ? {status: Math.max(...writes.map(e => e.status))} : null;
+if (document.querySelectorAll(arguments[0]).length > arguments[1]) return {toast: true};
+return null;
+"""
+
+# Число элементов по каждому селектору; -1 — селектор с ошибкой синтаксиса
+_JS_COUNT_SELECTORS = """
+const result = {};
+for (const [name, selector] of Object.entries(arguments[0])) {
+    try { result[name] = document.querySelectorAll(selector).length; } catch (e) { result[name] = -1; }
+}
+return result;
+"""
+
+# Что проверяет self_check: на карточке и в открытой модалке, с минимальным числом элементов
+SELF_CHECK_CARD = {"thumbnail": 1, "thumbnail_wrapper": 1, "save_button": 1}
+SELF_CHECK_DRAWER = {"pictures_drawer": 1, "loaded_image": 1, "big_image": 1, "upload_trigger": 1,
+                     "file_input": 2, "close_button": 1}
+
+
+@dataclass
+class SkuResult:
+    """Исход обработки одного SKU"""
+    outcome: str  # SKU_RESULT_*
+    reason: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome == SKU_RESULT_SUCCESS
+
+
+class SkuFailed(Exception):
+    """Обработка SKU не удалась; outcome — SKU_RESULT_PERMANENT или SKU_RESULT_TRANSIENT"""
+
+    def __init__(self, outcome: str, reason: str):
+        super().__init__(reason)
+        self.outcome = outcome
+
+
+class CaptchaError(RuntimeError):
+    """На странице капча — нужно дождаться её решения"""
+
+
+class ImageTooLarge(OSError):
+    pass
+
+
+class YandexMarketPhotoReloaderDriver:
+    def __init__(self, log_fn, profile_dir: Optional[str] = None, headless: bool = False,
+                 http_pool_size: int = HTTP_POOL_SIZE, http_retries: int = HTTP_RETRIES, api_mode: bool = API_MODE,
+                 perf_profile: bool = PERF_PROFILE):
+        self.driver = None
+        self.actions = None
+        self.wait: Optional[WebDriverWait] = None
+        self.log = log_fn
+        self.profile_dir = profile_dir
+        self.headless = headless
+        self.perf_profile = perf_profile
+        # профиль собирается один раз на процесс; ошибка в нём — ValueError уже здесь
+        self.ui = get_ui_profile()
+        self.css = self.ui.selectors
+        self.loc = {name: (By.CSS_SELECTOR, selector) for name, selector in self.css.items()}
+        self.step_timings: Dict[str, List[float]] = {}
+        self.captcha_checks = 0
+        self.captcha_check_time = 0.0
+        self.sku_timings: Dict[str, float] = {}  # этапы текущего SKU (PHASES), с; сбрасывает вызывающий
+        self.http_pool_size = http_pool_size
+        self.http_retries = http_retries
+        self.http: Optional[requests.Session] = None
+        self._cookie_fingerprint = None
+        self._cookies_synced_at = 0.0
+        self.work_dir: Optional[str] = None
+        # API-режим: сбрасывается в False, если повторять запросы в этой сессии нельзя или не выходит
+        self.api_mode = api_mode
+        self.network_log = False  # Chrome запущен с сетевым логом
+        self.replay: Optional[ReplayTemplate] = None
+        self._replay_samples: List[ReplayTemplate] = []
+        self._replay_failures = 0
+
+    def start(self):
+        self.work_dir = tempfile.mkdtemp(prefix="ym_images_")
+        self.driver = get_driver(self.profile_dir, self.headless, capture_network=self.api_mode, eager=self.perf_profile)
+        self.network_log = self.api_mode
+        self.actions = ActionChains(self.driver)
+        self.wait = WebDriverWait(self.driver, DEFAULT_WAIT)
+        if self.perf_profile:
+            self._block_urls()
+        self.log("Браузер запущен")
+
+    def _block_urls(self):
+        """Блокирует через DevTools счётчики, шрифты и оформление; страницы кабинета и фото товаров не трогает"""
+        patterns = blocked_url_patterns(self.ui.base_url, (self.ui.url("home"), self.ui.base_url + "/"))
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+        except WebDriverException as e:
+            # без блокировки всё работает, только медленнее
+            self.log(f"Не удалось включить блокировку лишних запросов: {e}")
+
+    def stop(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+            self.log("Браузер остановлен")
+        if self.http:
+            self.http.close()
+            self.http = None
+            self._cookie_fingerprint = None
+        if self.work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+
+    # -------------
+    # Auth & Cookies
+    # -------------
+    def open_home(self):
+        self.driver.get(self.ui.url("home"))
+
+    def save_cookies(self):
+        try:
+            cookies = self.driver.get_cookies()
+            with open(COOKIES_FILE, "wb") as f:
+                pickle.dump(cookies, f)
+            self.log("Cookies сохранены")
+        except Exception as e:
+            self.log(f"Не удалось сохранить cookies: {e}")
+
+    def load_cookies(self):
+        if not os.path.exists(COOKIES_FILE):
+            self.log("Файл cookies не найден — авторизуйтесь вручную")
+            return False
+        try:
+            self.driver.get(self.ui.url("home"))
+            with open(COOKIES_FILE, "rb") as f:
+                cookies = pickle.load(f)
+            for c in cookies:
+                # Selenium may require domain without leading dot
+                c = c.copy()
+                c.pop("sameSite", None)  # some drivers dislike this flag
+                try:
+                    self.driver.add_cookie(c)
+                except Exception:
+                    pass
+            self.driver.refresh()
+            self.log("Cookies загружены")
+            return True
+        except Exception as e:
+            self.log(f"Ошибка загрузки cookies: {e}")
+            return False
+
+    # -------------
+    # Helpers
+    # -------------
+    def _is_captcha(self) -> bool:
+        t0 = time.perf_counter()
+        try:
+            return bool(self.driver.execute_script(_JS_IS_CAPTCHA, self.css["captcha"]))
+        except Exception:
+            return False
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.captcha_checks += 1
+            self.captcha_check_time += elapsed
+            self.sku_timings["captcha"] = self.sku_timings.get("captcha", 0.0) + elapsed
+
+    def ensure_no_captcha(self):
+        if self._is_captcha():
+            raise CaptchaError("Обнаружена капча. Пожалуйста, решите её в открытом браузере — обработка продолжится сама.")
+
+    def _record_step(self, step: str, seconds: float):
+        self.step_timings.setdefault(step, []).append(seconds)
+
+    @contextmanager
+    def _phase(self, name: str):
+        """Добавляет время блока к этапу name в sku_timings, не считая проверок капчи внутри"""
+        t0 = time.perf_counter()
+        captcha_before = self.captcha_check_time
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0 - (self.captcha_check_time - captcha_before)
+            self.sku_timings[name] = self.sku_timings.get(name, 0.0) + elapsed
+
+    def _wait_js(self, script: str, timeout: float, *args):
+        """Опрос JS-условия до истинного значения и само это значение; None — по таймауту"""
+        try:
+            return WebDriverWait(self.driver, timeout, poll_frequency=WAIT_POLL_INTERVAL).until(
+                lambda d: d.execute_script(script, *args)
+            )
+        except TimeoutException:
+            return None
+
+    def timing_summary(self) -> str:
+        """Сводка по ожиданиям загрузки/сохранения, сэкономленному времени и проверкам капчи"""
+        parts = []
+        saved = 0.0
+        for step, values in self.step_timings.items():
+            if not values:
+                continue
+            parts.append(f"{step}: среднее {sum(values) / len(values):.2f} с ({len(values)} раз)")
+            saved += LEGACY_FIXED_WAIT * len(values) - sum(values)
+        if parts:
+            parts.append(f"сэкономлено против фиксированных пауз: {saved:.1f} с")
+        if self.captcha_checks:
+            parts.append(f"проверок капчи: {self.captcha_checks}, всего {self.captcha_check_time:.2f} с")
+        return "; ".join(parts)
+
+    @staticmethod
+    def extract_ints(text: str) -> Optional[str]:
+        m = re.search(r"(\d+)", text or "")
+        return m.group(1) if m else None
+
+    # -------------
+    # Cabinets scraping from settings page
+    # -------------
+    def open_business_settings(self, business_id: str):
+        url = self.ui.url("business_settings", business_id=business_id)
+        self.driver.get(url)
+        self.wait.until(lambda d: "settings" in d.current_url)
+        self.ensure_no_captcha()
+        self.log(f"Открыта страница настроек бизнеса {business_id}")
+
+    def scrape_cabinets_from_current_page(self) -> List[Cabinet]:
+        try:
+            self.driver.get(self.ui.url("business_list"))
+            WebDriverWait(self.driver, 10).until(
+                EC.presence_of_element_located(self.loc["business_list"])
+            )
+        except TimeoutException:
+            tabs = self.driver.window_handles
+            self.driver.switch_to.window(tabs[-1])
+            self.ensure_no_captcha()
+            self.wait.until(EC.presence_of_element_located(self.loc["business_list"]))
+
+        cards = self.driver.find_elements(*self.loc["business_card"])
+        cabinets: List[Cabinet] = []
+
+        for card in cards:
+            text = card.text
+            business_id = None
+            name = None
+
+            # --- ID ---
+            try:
+                bid_el = card.find_element(*self.loc["business_id"])
+                business_id = bid_el.text.strip()
+            except Exception:
+                match = re.search(r"\bID(?:\s+\S+)*\s+(\d+)\b", text, re.IGNORECASE)
+                if match:
+                    business_id = match.group(1)
+
+            # --- Name ---
+            try:
+                name_el = card.find_element(*self.loc["business_name"])
+                name = name_el.text.strip()
+            except Exception:
+                text_lines = [line.strip() for line in text.splitlines() if line.strip()]
+                if text_lines:
+                    # если первая строка содержит ID — убираем его
+                    if business_id and business_id in text_lines[0]:
+                        name = " ".join([w for w in text_lines[0].split() if business_id not in w])
+                    else:
+                        name = text_lines[0]
+                else:
+                    name = f"Бизнес {business_id or '?'}"
+
+            # --- Ссылка в кабинет ---
+            dashboard_link = ""
+            if business_id:
+                try:
+                    link_el = self.driver.find_element(
+                        By.XPATH, f"//a[contains(@href,'/business/{business_id}/dashboard')]"
+                    )
+                    dashboard_link = link_el.get_attribute("href")
+                except Exception:
+                    try:
+                        link_el2 = card.find_element(
+                            By.XPATH, ".//following::a[contains(@href,'/business/') and contains(@href,'/dashboard')][1]"
+                        )
+                        dashboard_link = link_el2.get_attribute("href")
+                    except Exception:
+                        dashboard_link = ""
+
+            cabinets.append(Cabinet(business_id=business_id, name=name, dashboard_href=dashboard_link))
+
+        if not cabinets:
+            self.log("Не найдено ни одного кабинета на странице — проверьте, верная ли страница.")
+        else:
+            self.log(f"Найдено кабинетов: {len(cabinets)}")
+
+        return cabinets
+
+
+    def get_campaign_id_from_business(self, business_id: str) -> Optional[str]:
+        # Откроем страницу, где есть ссылка /business/{id}/showcase?campaignId=...
+        url = self.ui.url("business", business_id=business_id)
+        self.driver.get(url)
+        try:
+            self.wait.until(EC.presence_of_element_located((By.XPATH, f"//a[contains(@href,'/business/{business_id}/showcase') and contains(@href,'campaignId=')]")))
+        except TimeoutException:
+            # иногда ссылка доступна из меню/переключения — попробуем перейти в разделы
+            pass
+
+        self.ensure_no_captcha()
+        links = self.driver.find_elements(By.XPATH, f"//a[contains(@href,'/business/{business_id}/showcase') and contains(@href,'campaignId=')]")
+        if not links:
+            # Возможно, ссылка доступна из меню. Попробуем искать глобально
+            links = self.driver.find_elements(By.XPATH, "//a[contains(@href,'/showcase?campaignId=')]")
+        for a in links:
+            href = a.get_attribute("href")
+            m = re.search(r"campaignId=(\d+)", href or "")
+            if m:
+                cid = m.group(1)
+                self.log(f"Найден campaignId: {cid}")
+                return cid
+        self.log("Не удалось найти campaignId для выбранного кабинета")
+        return None
+
+    # -------------
+    # Offer page -> open picture modal -> download last image -> upload back -> save
+    # -------------
+    def _http_session(self) -> requests.Session:
+        """Долгоживущая HTTP-сессия с пулом keep-alive соединений и cookies браузера"""
+        if self.http is None:
+            sess = requests.Session()
+            retry = Retry(
+                total=self.http_retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["GET", "HEAD"]),
+            )
+            adapter = HTTPAdapter(pool_connections=self.http_pool_size, pool_maxsize=self.http_pool_size, max_retries=retry)
+            sess.mount("https://", adapter)
+            sess.mount("http://", adapter)
+            self.http = sess
+        self._sync_cookies()
+        return self.http
+
+    def _sync_cookies(self, force: bool = False):
+        """Переносит cookies из браузера, только если они изменились (не чаще COOKIE_SYNC_INTERVAL)"""
+        now = time.monotonic()
+        if not force and self._cookie_fingerprint is not None and now - self._cookies_synced_at < COOKIE_SYNC_INTERVAL:
+            return
+        self._cookies_synced_at = now
+        cookies = self.driver.get_cookies()
+        fingerprint = tuple(sorted((c.get('name'), c.get('value'), c.get('domain'), c.get('path')) for c in cookies))
+        if fingerprint == self._cookie_fingerprint:
+            return
+        self._cookie_fingerprint = fingerprint
+        self.http.cookies.clear()
+        for c in cookies:
+            try:
+                self.http.cookies.set(c.get('name'), c.get('value'), domain=c.get('domain'), path=c.get('path'))
+            except Exception:
+                # fallback without domain/path
+                self.http.cookies.set(c.get('name'), c.get('value'))
+
+    def _spool_path(self, sku: str) -> str:
+        """Путь для картинки SKU в рабочей папке сессии (одна папка на весь запуск)"""
+        name = hashlib.sha1(sku.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.work_dir, f"{name}.webp")
+
+    @staticmethod
+    def _image_path(dest_path: str, content_type: str) -> str:
+        """dest_path с расширением по Content-Type ответа; тип не картинка или неизвестен — как есть"""
+        ext = mimetypes.guess_extension(content_type) if content_type.startswith("image/") else None
+        if not ext:
+            return dest_path
+        return os.path.splitext(dest_path)[0] + ext
+
+    def _ensure_spool_space(self, needed: int, keep: Optional[str] = None):
+        """Освобождает место в рабочей папке под needed байт, удаляя самые старые файлы (кроме keep)"""
+        entries = []
+        for entry in os.scandir(self.work_dir):
+            if entry.is_file():
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        used = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if used + needed <= SPOOL_MAX_BYTES:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                used -= size
+            except OSError:
+                pass
+        if used + needed > SPOOL_MAX_BYTES:
+            raise OSError(f"Рабочая папка изображений переполнена ({used} байт)")
+
+    def _download_image(self, url: str, dest_path: str) -> str:
+        """Скачивает url; возвращает путь к файлу — dest_path с расширением по Content-Type"""
+        # url может быть //avatars.mds.yandex.net/...
+        if url.startswith("//"):
+            url = "https:" + url
+        sess = self._http_session()
+        r = sess.get(url, timeout=60, stream=True)
+        if r.status_code in (401, 403):
+            # cookies в браузере могли обновиться после последней сверки
+            r.close()
+            self._sync_cookies(force=True)
+            r = sess.get(url, timeout=60, stream=True)
+        with r:
+            r.raise_for_status()
+            expected = int(r.headers.get("Content-Length") or 0)
+            if expected > MAX_IMAGE_BYTES:
+                raise ImageTooLarge(f"Изображение слишком большое: {expected} байт")
+            self._ensure_spool_space(expected or DOWNLOAD_CHUNK_SIZE)
+
+            content_type = r.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            dest_path = self._image_path(dest_path, content_type)
+            part_path = dest_path + ".part"
+            written = 0
+            reserved = expected or DOWNLOAD_CHUNK_SIZE
+            try:
+                with open(part_path, "wb") as f:
+                    for chunk in r.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        written += len(chunk)
+                        if written > MAX_IMAGE_BYTES:
+                            raise ImageTooLarge(f"Изображение больше {MAX_IMAGE_BYTES} байт")
+                        if written > reserved:
+                            # без Content-Length место резервируется по ходу; уже записанная
+                            # часть файла учтена в занятом месте
+                            f.flush()
+                            reserved = min(written + SPOOL_RESERVE_STEP, MAX_IMAGE_BYTES)
+                            self._ensure_spool_space(reserved - f.tell(), keep=part_path)
+                        f.write(chunk)
+                os.replace(part_path, dest_path)
+            except BaseException:
+                self._remove_spool_file(part_path)
+                raise
+        return dest_path
+
+    @staticmethod
+    def _remove_spool_file(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _open_pictures_modal(self, campaign_id: str, sku: str, logger):
+        """Открывает карточку товара и модалку с картинками; при неудаче — SkuFailed"""
+        self.ensure_no_captcha()
+        offer_url = self.ui.url("offer_card", campaign_id=campaign_id, article=sku)
+        with self._phase("navigate"):
+            self.driver.get(offer_url)
+
+        try:
+            # Ждем превью картинок; на капче не ждём таймаута — она сразу уходит в ensure_no_captcha
+            with self._phase("thumbnails"):
+                self.wait.until(lambda d: d.find_elements(*self.loc["thumbnail"]) or self._is_captcha())
+        except TimeoutException:
+            self.ensure_no_captcha()
+            if self.driver.find_elements(*self.loc["save_button"]):
+                # карточка отрисовалась, но фото у неё нет — повтор ничего не изменит
+                raise SkuFailed(SKU_RESULT_PERMANENT, "Нет превью изображений на карточке")
+            # страница ошибки, медленная загрузка или обрыв сети — кабинет может ожить
+            raise SkuFailed(SKU_RESULT_TRANSIENT, "Карточка товара не загрузилась")
+
+        self.ensure_no_captcha()
+
+        with self._phase("modal"):
+            attempts = 0
+            success = False
+            while attempts < RETRY_COUNT and not success:
+                attempts += 1
+                # Клик по первому превью
+                try:
+                    first_thumb_fake = self.wait.until(EC.presence_of_element_located(self.loc["thumbnail"]))
+                    first_thumb_real = self.driver.find_elements(*self.loc["thumbnail_wrapper"])[0]
+                    self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", first_thumb_fake)
+                
+                    # Навести мышь на элемент
+                    self.actions.move_to_element(first_thumb_fake).click().perform()
+                    # first_thumb_real.click()
+                except Exception as e:
+                    logger(f"[{sku}] Не удалось кликнуть превью: {e}")
+                    self.ensure_no_captcha()
+
+                # Ждем модалку
+                try:
+                    modal = self.wait.until(EC.presence_of_element_located(self.loc["pictures_drawer"]))
+                    success = True
+                except TimeoutException:
+                    self.ensure_no_captcha()
+                if not success:
+                    raise SkuFailed(SKU_RESULT_TRANSIENT, "Модальное окно с картинками не открылось")
+
+        return modal
+
+    def _last_image_src(self, modal, sku: str, logger) -> str:
+        # Найти все большие изображения в модалке, взять последнее
+        try:
+            with self._phase("modal"):
+                self.wait.until(EC.presence_of_element_located(self.loc["loaded_image"]))
+            big_images = modal.find_elements(*self.loc["big_image"])
+            if not big_images:
+                raise SkuFailed(SKU_RESULT_PERMANENT, "Не найдено больших изображений в модалке")
+            last_img = big_images[-1]
+            src = last_img.get_attribute("src")
+            if not src:
+                raise SkuFailed(SKU_RESULT_TRANSIENT, "Не удалось получить src последнего изображения")
+        except SkuFailed:
+            raise
+        except Exception as e:
+            raise SkuFailed(SKU_RESULT_TRANSIENT, f"Ошибка получения изображения: {e}")
+        return src
+
+    def _download_to_spool(self, src: str, sku: str) -> str:
+        try:
+            with self._phase("download"):
+                path = self._download_image(src, self._spool_path(sku))
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            outcome = SKU_RESULT_PERMANENT if status in (404, 410) else SKU_RESULT_TRANSIENT
+            raise SkuFailed(outcome, f"Не удалось скачать изображение: {e}")
+        except ImageTooLarge as e:
+            raise SkuFailed(SKU_RESULT_PERMANENT, f"Не удалось скачать изображение: {e}")
+        except Exception as e:
+            raise SkuFailed(SKU_RESULT_TRANSIENT, f"Не удалось скачать изображение: {e}")
+        return path
+
+    def resolve_image(self, campaign_id: str, sku: str, logger) -> Optional[str]:
+        """Стадия предзагрузки: находит последнее изображение карточки и скачивает его.
+
+        Возвращает путь к файлу в рабочей папке этой сессии или None. Капча — CaptchaError.
+        """
+        try:
+            modal = self._open_pictures_modal(campaign_id, sku, logger)
+            src = self._last_image_src(modal, sku, logger)
+            return self._download_to_spool(src, sku)
+        except SkuFailed as e:
+            logger(f"[{sku}] Предзагрузка: {e}")
+            return None
+
+    def _count_selectors(self, names) -> Dict[str, int]:
+        return self.driver.execute_script(_JS_COUNT_SELECTORS, {name: self.css[name] for name in names})
+
+    def self_check(self, campaign_id: str, skus: List[str]) -> Dict[str, str]:
+        """Быстрая проверка селекторов профиля на первой карточке с фото, без загрузки и сохранения.
+
+        Возвращает {имя селектора: что не так}; пустой словарь — всё найдено. Капча — CaptchaError.
+        """
+        wait = WebDriverWait(self.driver, SELF_CHECK_TIMEOUT, poll_frequency=WAIT_POLL_INTERVAL)
+        counts: Dict[str, int] = {}
+        for sku in skus[:SELF_CHECK_MAX_CARDS]:
+            self.driver.get(self.ui.url("offer_card", campaign_id=campaign_id, article=sku))
+            try:
+                wait.until(lambda d: d.find_elements(*self.loc["thumbnail"]) or self._is_captcha())
+            except TimeoutException:
+                pass
+            self.ensure_no_captcha()
+            counts = self._count_selectors(SELF_CHECK_CARD)
+            if counts["thumbnail"] > 0:
+                break
+        else:
+            # ни на одной из первых карточек нет превью — модалку открыть не на чем
+            problems = self._check_counts(counts, SELF_CHECK_CARD)
+            problems.update({name: "не проверен: нет карточки с превью" for name in SELF_CHECK_DRAWER})
+            return problems
+
+        try:
+            thumb = self.driver.find_elements(*self.loc["thumbnail"])[0]
+            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", thumb)
+            self.actions.move_to_element(thumb).click().perform()
+            wait.until(EC.presence_of_element_located(self.loc["pictures_drawer"]))
+            wait.until(EC.presence_of_element_located(self.loc["loaded_image"]))
+        except (TimeoutException, WebDriverException):
+            pass
+        self.ensure_no_captcha()
+        counts.update(self._count_selectors(SELF_CHECK_DRAWER))
+        return self._check_counts(counts, {**SELF_CHECK_CARD, **SELF_CHECK_DRAWER})
+
+    @staticmethod
+    def _check_counts(counts: Dict[str, int], minimums: Dict[str, int]) -> Dict[str, str]:
+        problems = {}
+        for name, minimum in minimums.items():
+            found = counts.get(name, 0)
+            if found < 0:
+                problems[name] = "ошибка в селекторе"
+            elif found < minimum:
+                problems[name] = f"найдено {found}, нужно не меньше {minimum}"
+        return problems
+
+    def process_sku(self, campaign_id: str, sku: str, logger, prefetched_path: Optional[str] = None) -> SkuResult:
+        """Обрабатывает один SKU; исход (успех, постоянная/временная ошибка, капча) — в SkuResult"""
+        try:
+            return self._process_sku(campaign_id, sku, logger, prefetched_path)
+        except SkuFailed as e:
+            logger(f"[{sku}] {e}")
+            return SkuResult(e.outcome, str(e))
+        except CaptchaError as e:
+            return SkuResult(SKU_RESULT_CAPTCHA, str(e))
+
+    def _process_sku(self, campaign_id: str, sku: str, logger, prefetched_path: Optional[str]) -> SkuResult:
+        if self.network_log and not self.api_mode:
+            # API-режим выключился, а Chrome продолжает писать сетевой лог — не даём ему копиться
+            self._network_requests()
+        replay_tried = False
+        if prefetched_path and os.path.exists(prefetched_path) and self._replay_ready(campaign_id):
+            # картинка уже скачана, запросы выучены — карточку можно не открывать
+            replay_tried = True
+            if self._replay(sku, prefetched_path, logger):
+                self._remove_spool_file(prefetched_path)
+                return SkuResult(SKU_RESULT_SUCCESS)
+
+        modal = self._open_pictures_modal(campaign_id, sku, logger)
+
+        if prefetched_path and os.path.exists(prefetched_path):
+            # Картинка уже скачана стадией предзагрузки; дожидаемся только отрисовки модалки
+            try:
+                with self._phase("modal"):
+                    self.wait.until(EC.presence_of_element_located(self.loc["loaded_image"]))
+            except TimeoutException:
+                raise SkuFailed(SKU_RESULT_TRANSIENT, "Изображения в модалке не загрузились")
+            tmp_path = prefetched_path
+            logger(f"[{sku}] Используем заранее скачанное изображение")
+        else:
+            src = self._last_image_src(modal, sku, logger)
+            # Скачиваем в рабочую папку сессии
+            tmp_path = self._download_to_spool(src, sku)
+            logger(f"[{sku}] Изображение скачано: {tmp_path}")
+
+        try:
+            if not replay_tried and self._replay_ready(campaign_id) and self._replay(sku, tmp_path, logger):
+                return SkuResult(SKU_RESULT_SUCCESS)
+            capture = self._start_capture(campaign_id, sku, modal) if self.api_mode else None
+            with self._phase("upload"):
+                self._upload(sku, modal, tmp_path, logger)
+            if capture:
+                capture["upload"] = self._network_requests()
+            with self._phase("save"):
+                self._save(sku, logger)
+            if capture:
+                capture["save"] = self._network_requests()
+                self._learn_replay(capture)
+        finally:
+            self._remove_spool_file(tmp_path)
+        return SkuResult(SKU_RESULT_SUCCESS)
+
+    def _upload(self, sku: str, modal, tmp_path: str, logger):
+        # Нажимаем на первую кнопку загрузки (upload_trigger) в модалке
+        try:
+            upload_trigger = self.driver.find_elements(*self.loc["upload_trigger"])[0]
+            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", upload_trigger)
+            # upload_trigger.click()
+        except Exception as e:
+            raise SkuFailed(SKU_RESULT_TRANSIENT, f"Не удалось кликнуть кнопку загрузки: {e}")
+
+        # Ищем input[type=file] и отправляем файл
+        try:
+            # file_input = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='file']:nth-of-type(2)")))
+           
+            file_inputs = self.wait.until(EC.presence_of_all_elements_located(self.loc["file_input"]))
+            if len(file_inputs) >= 2:
+                file_input = file_inputs[1]  # второй элемент (индекс 1)
+            else:
+                raise Exception("Недостаточно file input элементов")
+
+            loaded_before = len(modal.find_elements(*self.loc["loaded_image"]))
+            file_input.send_keys(tmp_path)
+            logger(f"[{sku}] Файл отправлен на загрузку")
+        except TimeoutException:
+            raise SkuFailed(SKU_RESULT_TRANSIENT, "Не найден input[type=file] для загрузки")
+        except Exception as e:
+            raise SkuFailed(SKU_RESULT_TRANSIENT, f"Ошибка отправки файла: {e}")
+
+        # Ждём завершения загрузки: новое превью в модалке и нет индикатора прогресса
+        t0 = time.perf_counter()
+        uploaded = self._wait_js(_JS_UPLOAD_DONE, UPLOAD_TIMEOUT, self.css["pictures_drawer"], loaded_before,
+                                 self.css["upload_busy"], self.css["loaded_image"])
+        upload_wait = time.perf_counter() - t0
+        self._record_step("ожидание загрузки", upload_wait)
+        self.ensure_no_captcha()
+        if not uploaded:
+            # без новой картинки сохранять нечего — иначе SKU отметится обработанным впустую
+            raise SkuFailed(SKU_RESULT_TRANSIENT, f"Картинка не загрузилась за {UPLOAD_TIMEOUT} с")
+
+    def _save(self, sku: str, logger):
+        # Закрыть модалку
+        try:
+            close_btn = self.driver.find_element(*self.loc["close_button"])
+            self.driver.execute_script("arguments[0].click();", close_btn)
+        except Exception:
+            # не критично — попробуем дальше
+            pass
+
+        # Сохранить изменения
+        try:
+            save_btn = self.wait.until(EC.element_to_be_clickable(self.loc["save_button"]))
+            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", save_btn)
+            toasts_before, clicked_at = self.driver.execute_script(_JS_SAVE_PREPARE, self.css["save_success_toast"])
+            save_btn.click()
+        except TimeoutException:
+            raise SkuFailed(SKU_RESULT_TRANSIENT, "Кнопка Сохранить не найдена")
+        except Exception as e:
+            raise SkuFailed(SKU_RESULT_TRANSIENT, f"Ошибка клика по Сохранить: {e}")
+
+        # Ждём подтверждения: уведомление или завершённый запрос сохранения
+        t0 = time.perf_counter()
+        saved = self._wait_js(_JS_SAVE_DONE, SAVE_TIMEOUT, self.css["save_success_toast"], toasts_before, clicked_at)
+        save_wait = time.perf_counter() - t0
+        self._record_step("ожидание сохранения", save_wait)
+        self.ensure_no_captcha()
+        status = (saved or {}).get("status")
+        if status is not None and not 200 <= status < 400:
+            # status 0 — запрос оборвался без ответа
+            raise SkuFailed(SKU_RESULT_TRANSIENT, f"Запрос сохранения завершился с ошибкой (HTTP {status})")
+        if not saved:
+            # без подтверждения SKU не отмечаем обработанным: иначе он пропускался бы и в следующих запусках
+            raise SkuFailed(SKU_RESULT_TRANSIENT, f"Сохранение не подтверждено за {SAVE_TIMEOUT} с")
+        logger(f"[{sku}] Сохранено за {save_wait:.1f} с")
+
+    # -------------
+    # API mode: upload & save requests learned from the network log, replayed over HTTP
+    # -------------
+    def _network_requests(self) -> List[CapturedRequest]:
+        """Запросы с телом из сетевого лога с прошлого вызова (чтение лог очищает)"""
+        try:
+            return parse_performance_log(self.driver.get_log("performance"))
+        except WebDriverException:
+            return []
+
+    def _cdp_for_request(self, command: str, request_id: str) -> Optional[dict]:
+        try:
+            return self.driver.execute_cdp_cmd(command, {"requestId": request_id})
+        except WebDriverException:
+            # браузер мог уже выбросить тело из буфера
+            return None
+
+    def _fill_bodies(self, captured: List[CapturedRequest]):
+        """Дочитывает через DevTools тела запросов и ответов, которых нет в самом логе"""
+        for request in captured:
+            if not request.ok:
+                continue
+            if request.post_data is None and request.has_post_data:
+                data = self._cdp_for_request("Network.getRequestPostData", request.request_id)
+                if data:
+                    request.post_data = data.get("postData")
+            data = self._cdp_for_request("Network.getResponseBody", request.request_id)
+            if data:
+                body = data.get("body", "")
+                if data.get("base64Encoded"):
+                    body = base64.b64decode(body).decode("utf-8", "replace")
+                request.response_body = body
+
+    def _start_capture(self, campaign_id: str, sku: str, modal) -> dict:
+        """Запоминает, что нужно для обучения на этом SKU, и очищает сетевой лог перед загрузкой"""
+        self._network_requests()
+        pictures = [img.get_attribute("src") for img in modal.find_elements(*self.loc["big_image"])]
+        return {"campaign_id": campaign_id, "sku": sku, "page_url": self.driver.current_url,
+                "pictures": [src for src in pictures if src]}
+
+    def _learn_replay(self, capture: dict):
+        """Шаблон из запросов, пойманных на SKU; включается, когда API_LEARN_SAMPLES SKU подряд совпали"""
+        try:
+            self._fill_bodies(capture["upload"] + capture["save"])
+            template = build_replay_template(capture["campaign_id"], capture["sku"], capture["page_url"],
+                                             capture["upload"], capture["save"], capture["pictures"])
+        except UnsafeReplay as e:
+            self.api_mode = False
+            self.log(f"API-режим выключен: {e}")
+            return
+        except ValueError as e:
+            self.log(f"API-режим: не удалось выучить запросы: {e}")
+            self._api_failure(f"не удалось выучить запросы: {e}")
+            return
+        self._replay_samples = (self._replay_samples + [template])[-API_LEARN_SAMPLES:]
+        if len(self._replay_samples) < API_LEARN_SAMPLES:
+            return
+        if all(sample.matches(template) for sample in self._replay_samples[:-1]):
+            self.replay = template
+            self.log("API-режим: запросы загрузки и сохранения выучены, дальше SKU идут через HTTP")
+        else:
+            reason = "запросы разных SKU отличаются не только SKU — в них есть данные карточки"
+            self.log(f"API-режим: {reason}")
+            self._api_failure(reason)
+
+    def _api_failure(self, reason: str):
+        self._replay_failures += 1
+        if self._replay_failures >= API_REPLAY_MAX_FAILURES:
+            self.api_mode = False
+            self.replay = None
+            self.log(f"API-режим выключен после {self._replay_failures} неудач подряд: {reason}")
+
+    def _replay_ready(self, campaign_id: str) -> bool:
+        return self.api_mode and self.replay is not None and self.replay.campaign_id == campaign_id
+
+    def _replay(self, sku: str, path: str, logger) -> bool:
+        """Загрузка и сохранение выученными запросами; False — SKU нужно пройти через интерфейс"""
+        template = self.replay
+        # лог копится и здесь: карточки без предзагрузки всё равно открываются в браузере
+        self._network_requests()
+        sess = self._http_session()
+        # расширение файлу дал Content-Type ответа при скачивании (_image_path), так что это тип картинки
+        mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        try:
+            with self._phase("upload"):
+                with open(path, "rb") as f:
+                    files = {template.upload.file_field: (os.path.basename(path), f, mime)}
+                    r = sess.request(**template.upload.render(sku), files=files, timeout=UPLOAD_TIMEOUT)
+                r.raise_for_status()
+                uploaded = r.json() if template.upload.response_json else None
+            with self._phase("save"):
+                for step in template.save:
+                    r = sess.request(**step.render(sku, uploaded), timeout=SAVE_TIMEOUT)
+                    r.raise_for_status()
+                    if step.response_json:
+                        r.json()
+        except (requests.RequestException, ValueError, OSError) as e:
+            logger(f"[{sku}] Повтор запросов не удался ({e}) — загружаем через интерфейс")
+            if isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code in (401, 403):
+                self._sync_cookies(force=True)
+            # переучиться на этом же SKU: выученная форма запросов уже подтверждена
+            self._replay_samples = [template]
+            self.replay = None
+            self._api_failure(f"повтор не удался: {e}")
+            return False
+        self._replay_failures = 0
+        logger(f"[{sku}] Загружено и сохранено через API")
+        return True
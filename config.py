@@ -0,0 +1,142 @@
+"""Общие настройки: файлы, таймауты, размеры пулов и кэшей"""
+import os
+
+# ======================
+# Адреса и селекторы кабинета (см. ui_profile.py)
+# ======================
+# Хэшированные классы вёрстки меняются при обновлениях кабинета — их можно поправить
+# без правки кода в JSON-файле UI_PROFILE_FILE с теми же разделами base_url/urls/selectors.
+# Переменная окружения YM_PARTNER_BASE_URL подменяет base_url (например, на локальный
+# стенд benchmarks/mock_partner.py).
+UI_PROFILES = {
+    "market": {
+        "base_url": "https://partner.market.yandex.ru",
+        "urls": {
+            "home": "/",
+            "business_list": "/main-redirect",
+            "business": "/business/{business_id}",
+            "business_settings": "/business/{business_id}/settings?activeTab=all",
+            "offer_card": "/supplier/{campaign_id}/assortment/offer-card?article={article}&source=businessStocks",
+        },
+        "selectors": {
+            # карточка товара
+            "thumbnail": "img.styles-picture___6gWHl",
+            "thumbnail_wrapper": "span.styles-layout___1YRjC",
+            "save_button": "button[data-e2e='next-step-button']",
+            # только уведомление об успехе: «Не удалось сохранить» — тоже [role='alert']
+            "save_success_toast": (
+                "[data-e2e*='notification'][data-e2e*='success'], "
+                "[class*='toast'][class*='success'], [class*='Toast'][class*='success']"
+            ),
+            # модалка с картинками
+            "pictures_drawer": "div.___wrapper___7pLKs.style-picturesDrawer___55UwA",
+            "loaded_image": "img[data-testid='loaded-image']",
+            "big_image": "img.style-root___17qgj.style-main___6BATS",
+            "upload_trigger": "span.___content___2ml2l",
+            "file_input": "input[type='file']",
+            "upload_busy": "[role='progressbar'], [aria-busy='true']",
+            "close_button": "span[aria-label='Закрыть']",
+            # список бизнесов
+            "business_list": "div[data-e2e='business-list']",
+            "business_card": "div[data-e2e='business-card-wrapper']",
+            "business_id": "[data-e2e='business-id']",
+            "business_name": "span[data-e2e='business-card-name']",
+            "captcha": (
+                ".CheckboxCaptcha, .AdvancedCaptcha, #checkbox-captcha-form, "
+                "form[action*='captcha'], iframe[src*='captcha']"
+            ),
+        },
+    },
+}
+UI_PROFILE = os.environ.get("YM_UI_PROFILE", "market")
+UI_PROFILE_FILE = os.environ.get("YM_UI_PROFILE_FILE", "ui_profile.json")
+SELF_CHECK_TIMEOUT = 10  # ожидание карточки и модалки при проверке селекторов перед запуском
+SELF_CHECK_MAX_CARDS = 3  # сколько первых SKU пробовать, если у карточки нет фото
+
+# ======================
+# Persistent storage
+# ======================
+DB_FILE = "processed_items.sqlite3"
+COOKIES_FILE = "cookies.pkl"
+PROFILES_DIR = "chrome_profiles"
+POOL_MAX_SIZE = 8
+PREFETCH_MAX_DEPTH = 10
+DEFAULT_WAIT = 20
+RETRY_COUNT = 3
+RETRY_DELAY = 2  # минимальная пауза до повтора отложенного SKU после первой неудачи, дальше удваивается
+RETRY_MAX_DELAY = 30
+RETRY_JITTER = 0.5  # доля паузы, которая выбирается случайно, чтобы сессии не повторяли синхронно
+UPLOAD_TIMEOUT = 30
+SAVE_TIMEOUT = 15
+CLOSE_WAIT_SEC = 10  # сколько при закрытии окна ждать остановки обработки
+WAIT_POLL_INTERVAL = 0.1
+CAPTCHA_POLL_INTERVAL = 1.0  # первая проверка, решена ли капча; дальше интервал удваивается
+CAPTCHA_POLL_MAX_INTERVAL = 10.0
+HTTP_POOL_SIZE = 4
+HTTP_RETRIES = 3
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_BYTES = 50 * 1024 * 1024
+SPOOL_MAX_BYTES = 500 * 1024 * 1024  # предел места под скачанные картинки на одну сессию
+SPOOL_RESERVE_STEP = 1024 * 1024  # без Content-Length место под картинку резервируется по ходу такими шагами
+API_MODE = False  # загрузка и сохранение повтором запросов кабинета через HTTP (api_replay.py)
+API_LEARN_SAMPLES = 2  # сколько SKU пройти через интерфейс, прежде чем повторять запросы
+API_REPLAY_MAX_FAILURES = 3  # после стольких неудачных повторов подряд сессия остаётся на интерфейсе
+COOKIE_SYNC_INTERVAL = 30.0  # как часто сверять cookies браузера с HTTP-сессией, с
+LEGACY_FIXED_WAIT = 2.0  # прежняя фиксированная пауза после загрузки и после сохранения
+FLUSH_EVERY_ITEMS = 50
+FLUSH_INTERVAL_SEC = 5.0
+XLSX_CACHE_MAX_ENTRIES = 20
+XLSX_CACHE_MAX_AGE_DAYS = 30
+
+SKU_COLUMN_CANDIDATES = [
+    "Ваш SKU *", "Ваш SKU", "SKU", "Артикул", "Артикул продавца", "Article"
+]
+LOG_FILE = "reuploader.log"
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 5
+LOG_VIEW_MAX_LINES = 5000  # строк лога на экране, более старые уходят (полный лог — в LOG_FILE)
+LOG_FLUSH_INTERVAL_MS = 200
+
+# Облегчённая загрузка страниц: pageLoadStrategy=eager и блокировка через DevTools
+# (Network.setBlockedURLs, в шаблонах только *) всего, без чего кабинет работает.
+# Каждый шаблон — вида схема://хост/путь; {cabinet} — хост кабинета из профиля
+PERF_PROFILE = False
+PERF_BLOCKED_URLS = (
+    # счётчики и аналитика
+    "*://mc.yandex.ru/*", "*://mc.yandex.com/*", "*://an.yandex.ru/*", "*://{cabinet}/metrika/tag.js*",
+    "*://yandex.ru/clck/*", "*://www.google-analytics.com/*", "*://www.googletagmanager.com/*",
+    # шрифты — текст отрисуется системным
+    "*://yastatic.net/*.woff*", "*://yastatic.net/*.ttf*", "*://yastatic.net/*.otf*", "*://yastatic.net/*.eot*",
+    "*://{cabinet}/*.woff*", "*://{cabinet}/*.ttf*", "*://{cabinet}/*.otf*", "*://{cabinet}/*.eot*",
+    # оформление кабинета со статики
+    "*://yastatic.net/*.png*", "*://yastatic.net/*.jpg*", "*://yastatic.net/*.gif*", "*://yastatic.net/*.svg*",
+)
+# хосты, которые блокировать нельзя (фото товаров): шаблон, чей хост может с ними совпасть
+# или не задан вовсе, не применяется
+PERF_KEEP_HOSTS = ("avatars.mds.yandex.net",)
+
+# Этапы обработки SKU для замеров времени (ключи — колонки таблицы sku_timings)
+PHASES = ("navigate", "thumbnails", "modal", "download", "upload", "save", "captcha")
+PHASE_TITLES = {
+    "navigate": "переход",
+    "thumbnails": "превью",
+    "modal": "модалка",
+    "download": "скачивание",
+    "upload": "загрузка",
+    "save": "сохранение",
+    "captcha": "капча",
+}
+THROUGHPUT_WINDOW = 20  # последних SKU в скользящем окне для скорости и ETA
+
+# Исход обработки SKU (SkuResult.outcome)
+SKU_RESULT_SUCCESS = "success"
+SKU_RESULT_PERMANENT = "permanent"  # повтор не поможет (нет фото на карточке и т. п.)
+SKU_RESULT_TRANSIENT = "transient"  # сеть, таймауты, не отрисовался элемент — повторяем с паузой
+SKU_RESULT_CAPTCHA = "captcha"
+
+# Статусы SKU в списке
+SKU_STATUS_PENDING = "pending"
+SKU_STATUS_SKIPPED = "skipped"
+SKU_STATUS_DEFERRED = "deferred"  # временная ошибка, повтор после основного прохода
+SKU_STATUS_DONE = "done"
+SKU_STATUS_FAILED = "failed"
@@ -0,0 +1,140 @@
+"""Точка входа: без аргументов — GUI, подкоманда run — пакетная обработка без GUI.
+
+    python main.py run --campaign-id 12345 --xlsx stocks.xlsx --workers 2
+    python main.py run --campaign-id 12345 --xlsx stocks.xlsx --headless
+"""
+import argparse
+import sys
+import time
+from typing import List, Optional
+
+
+def _log(text: str):
+    timestamp = time.strftime("%H:%M:%S")
+    print(f"[{timestamp}] {text}", flush=True)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="yandex_partner_reuploader", description="Yandex Market Photo Reloader")
+    sub = parser.add_subparsers(dest="command")
+
+    run = sub.add_parser("run", help="обработать SKU из XLSX без GUI")
+    run.add_argument("--campaign-id", required=True, help="campaignId кабинета")
+    run.add_argument("--xlsx", required=True, help="выгрузка из вкладки «Остатки на складе»")
+    run.add_argument("--business-id", help="ID кабинета для сверки с ячейкой B3 файла")
+    run.add_argument("--workers", type=int, default=1, help="число браузерных сессий (по умолчанию 1)")
+    run.add_argument("--prefetch", type=int, default=0, help="на сколько SKU вперёд скачивать картинки (0 — выкл.)")
+    run.add_argument("--headless", action="store_true", help="Chrome без окна; при капче обработка прерывается")
+    run.add_argument("--no-skip-processed", action="store_true", help="обрабатывать заново уже обработанные SKU")
+    run.add_argument("--no-self-check", action="store_true", help="не проверять селекторы на первой карточке перед запуском")
+    run.add_argument("--api-mode", action="store_true",
+                     help="после первых SKU загружать и сохранять повтором запросов кабинета, без интерфейса")
+    run.add_argument("--perf-profile", action="store_true",
+                     help="не загружать счётчики, шрифты и оформление и не ждать полной загрузки страниц")
+    return parser
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    from browser import YandexMarketPhotoReloaderDriver
+    from config import API_MODE, PERF_PROFILE
+    from parser import load_xlsx_skus
+    from storage import Storage
+
+    storage = Storage()
+    try:
+        try:
+            header, skus, from_cache = load_xlsx_skus(args.xlsx, storage, log_fn=_log)
+        except Exception as e:
+            _log(f"Не удалось прочитать файл Excel: {e}")
+            return 2
+        _log(f"Загружено SKU: {len(skus)}{' (из кэша)' if from_cache else ''}, колонка '{header.sku_column_name}'")
+        if args.business_id and header.business_id and str(args.business_id) != header.business_id:
+            _log(f"В файле указан ID кабинета {header.business_id}, а передан {args.business_id} — остановка")
+            return 2
+        if not skus:
+            _log("Список SKU пуст")
+            return 0
+
+        try:
+            driver = YandexMarketPhotoReloaderDriver(_log, headless=args.headless, api_mode=args.api_mode or API_MODE,
+                                                     perf_profile=args.perf_profile or PERF_PROFILE)
+        except ValueError as e:
+            _log(f"Ошибка в профиле селекторов: {e}")
+            return 2
+        try:
+            driver.start()
+            if not driver.load_cookies():
+                _log("Нет сохранённых cookies — войдите через GUI и нажмите «Сохранить cookies»")
+                return 2
+            return _run(args, driver, storage, skus)
+        finally:
+            driver.stop()
+    finally:
+        storage.close()
+
+
+def _run(args: argparse.Namespace, driver, storage, skus: List[str]) -> int:
+    from runner import BatchRunner
+
+    runner: Optional[BatchRunner] = None
+
+    def on_captcha(msg: str):
+        if args.headless:
+            _log(f"{msg} В режиме --headless капчу решить нельзя — обработка прерывается.")
+            runner.abort()
+            return
+        # сессия сама заметит, что капча решена, и продолжит
+        _log(msg)
+
+    def on_progress(done: int, total: int):
+        eta = runner.stats.eta_seconds(total - done)
+        eta_text = f", осталось ~{eta / 60:.0f} мин" if eta is not None and done < total else ""
+        _log(f"Прогресс: {done}/{total} ({done * 100 // max(total, 1)}%), "
+             f"{runner.stats.rate_per_min():.1f} SKU/мин{eta_text}")
+
+    runner = BatchRunner(
+        driver, storage, args.campaign_id, skus,
+        skip_processed=not args.no_skip_processed,
+        pool_size=args.workers,
+        prefetch_depth=args.prefetch,
+        headless=args.headless,
+        self_check=not args.no_self_check,
+        log_fn=_log,
+        progress_fn=on_progress,
+        captcha_fn=on_captcha,
+    )
+
+    started = time.monotonic()
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        # браузер и хранилище закрываются после выхода всех сессий: их SKU ещё дописываются в БД
+        _log("Прервано пользователем")
+        runner.abort()
+        runner.join()
+    elapsed = time.monotonic() - started
+    if runner.check_failed:
+        return 2
+
+    attempted = runner.succeeded + runner.failed
+    rate = attempted / (elapsed / 60) if elapsed > 0 else 0.0
+    _log(
+        f"Итог: успешно {runner.succeeded}, не удалось {runner.failed}, "
+        f"пропущено ранее обработанных {runner.skipped}, всего в файле {len(skus)}; "
+        f"время {elapsed:.0f} с, {rate:.1f} SKU/мин"
+    )
+    return 1 if runner.failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    if args.command == "run":
+        return run_batch(args)
+
+    from yandex_partner_reuploader import main as gui_main
+    gui_main()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""Разбор XLSX-выгрузки «Остатки на складе».
+
+pandas и openpyxl импортируются внутри функций — только когда файл действительно
+загружается, чтобы не замедлять запуск окна.
+"""
+import hashlib
+import itertools
+import os
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from storage import Storage
+
+
+@dataclass
+class XlsxHeader:
+    header_row: int  # 1-based номер строки заголовков
+    sku_column: int  # 1-based номер колонки SKU
+    sku_column_name: str
+    business_id: Optional[str]  # ID кабинета из ячейки B3
+    total_rows: Optional[int] = None  # строк на листе по данным dimensions (может отсутствовать)
+
+
+def build_merged_index(ws) -> Dict[Tuple[int, int], Tuple[int, int]]:
+    """Карта (row, col) -> (row, col) верхней левой ячейки объединённого диапазона.
+
+    Строится один раз на лист, после чего поиск значения объединённой ячейки — O(1)
+    вместо перебора всех ws.merged_cells.ranges для каждой ячейки.
+    """
+    index: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    for merged_range in ws.merged_cells.ranges:
+        anchor = (merged_range.min_row, merged_range.min_col)
+        for row in range(merged_range.min_row, merged_range.max_row + 1):
+            for col in range(merged_range.min_col, merged_range.max_col + 1):
+                index[(row, col)] = anchor
+    return index
+
+
+def merged_cell_value(ws, merged_index: Dict[Tuple[int, int], Tuple[int, int]], row: int, col: int) -> str:
+    """Значение ячейки с учётом объединённых диапазонов (пустая строка, если значения нет)"""
+    value = ws.cell(row=row, column=col).value
+    if value is None:
+        anchor = merged_index.get((row, col))
+        if anchor is None:
+            return ""
+        value = ws.cell(row=anchor[0], column=anchor[1]).value
+        if value is None:
+            return ""
+    return str(value).strip()
+
+
+HEADER_SCAN_ROWS = 30
+DEFAULT_HEADER_ROW = 7
+EMPTY_ROWS_TO_STOP = 5
+
+
+def _norm_header(s) -> str:
+    return re.sub(r"[^a-zа-я0-9]+", " ", str(s).strip().lower())
+
+
+def find_sku_column(headers: List[str]) -> Optional[int]:
+    """Индекс (0-based) колонки SKU среди заголовков"""
+    for i, h in enumerate(headers):
+        nh = _norm_header(h)
+        if nh.startswith("ваш sku") or nh == "sku" or nh == "артикул":
+            return i
+    # запасной поиск
+    for cand in ["Ваш SKU", "SKU", "Артикул", "Код товара"]:
+        cand_n = _norm_header(cand)
+        for i, h in enumerate(headers):
+            if _norm_header(h).startswith(cand_n):
+                return i
+    return None
+
+
+def _cell_text(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def _row_has_data(row) -> bool:
+    return any(_cell_text(v) and _cell_text(v).lower() != "nan" for v in row)
+
+
+def _headers_from_rows(rows: List[tuple], header_row: int) -> List[str]:
+    """Заголовки колонок; пустые ищем в соседних строках (вертикально объединённая шапка)"""
+    width = max((len(r) for r in rows), default=0)
+    headers = []
+    for col in range(width):
+        header_val = ""
+        for row_num in (header_row, header_row - 1, header_row + 1, header_row + 2):
+            if 1 <= row_num <= len(rows) and col < len(rows[row_num - 1]):
+                header_val = _cell_text(rows[row_num - 1][col])
+                if header_val:
+                    break
+        headers.append(header_val or f"Column_{col + 1}")
+    return headers
+
+
+def _iter_column(rows: Iterator[tuple], col_idx: int) -> Iterator:
+    """Значения колонки до конца данных (EMPTY_ROWS_TO_STOP пустых строк подряд)"""
+    seen_data = False
+    empty_run = 0
+    for row in rows:
+        if not _row_has_data(row):
+            if seen_data:
+                empty_run += 1
+                if empty_run >= EMPTY_ROWS_TO_STOP:
+                    return
+            continue
+        seen_data = True
+        empty_run = 0
+        if col_idx < len(row):
+            yield row[col_idx]
+
+
+def _iter_skus_with_merged_cells(path: str, header_row: int) -> Tuple[int, str, Iterator]:
+    """Запасной путь: полный DOM листа с учётом объединённых ячеек в колонке SKU"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, data_only=True)
+    try:
+        ws = wb.active
+        merged_index = build_merged_index(ws)
+        max_col = ws.max_column or 20
+        rows = [
+            tuple(merged_cell_value(ws, merged_index, r, c) for c in range(1, max_col + 1))
+            for r in range(1, min(header_row + 2, ws.max_row) + 1)
+        ]
+        headers = _headers_from_rows(rows, header_row)
+        col_idx = find_sku_column(headers)
+        if col_idx is None:
+            raise ValueError(
+                "Не найдена колонка со SKU. Убедитесь, что столбец называется 'Ваш SKU *' или аналогично. "
+                f"Найденные колонки: {headers}"
+            )
+        values = [
+            merged_cell_value(ws, merged_index, r, col_idx + 1)
+            for r in range(header_row + 1, ws.max_row + 1)
+        ]
+    finally:
+        wb.close()
+    return col_idx + 1, headers[col_idx], (v for v in values)
+
+
+def clean_sku_batch(values: list, seen: set) -> Tuple[List[str], int, int]:
+    """Векторная очистка пачки сырых значений колонки SKU.
+
+    Обрезает пробелы, отбрасывает пустые и 'nan', убирает дубликаты с сохранением
+    порядка (в том числе уже встреченные в предыдущих пачках — множество seen
+    пополняется). Возвращает (SKU, убрано пустых, убрано дубликатов).
+    """
+    import pandas as pd
+
+    col = pd.Series(values, dtype=object)
+    missing = col.isna()
+    col = col[~missing].astype(str).str.strip()
+    empty = (col == "") | (col.str.lower() == "nan")
+    col = col[~empty]
+    # повторы внутри пачки и встреченные в прошлых пачках — без вызова Python на каждый элемент;
+    # isin получает только пересечение с seen, а не всё растущее множество
+    unique = col.unique()
+    dup = col.duplicated() | col.isin(seen.intersection(unique))
+    skus = col[~dup].tolist()
+    seen.update(unique)
+    return skus, int(missing.sum() + empty.sum()), int(dup.sum())
+
+
+def file_content_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def open_xlsx_skus(path: str) -> Tuple[XlsxHeader, Iterator]:
+    """Однопроходное потоковое чтение выгрузки остатков.
+
+    Читает лист через iter_rows(values_only=True) в режиме read_only: буферизует только
+    первые HEADER_SCAN_ROWS строк, чтобы найти шапку, ID кабинета (B3) и колонку SKU,
+    а затем возвращает генератор сырых значений SKU по оставшимся строкам.
+    Если колонка SKU в потоковом режиме не найдена, используется полный DOM листа.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, data_only=True, read_only=True)
+    try:
+        ws = wb.active
+        total_rows = ws.max_row
+        rows_iter = ws.iter_rows(values_only=True)
+
+        head: List[tuple] = []
+        header_row = None
+        for row in rows_iter:
+            head.append(row)
+            if header_row is None and any("ваш sku" in _cell_text(v).lower() for v in row):
+                header_row = len(head)
+            # Для шапки нужны соседние строки снизу (объединённые ячейки)
+            if header_row is not None and len(head) >= header_row + 2:
+                break
+            if header_row is None and len(head) >= HEADER_SCAN_ROWS:
+                break
+        if header_row is None:
+            header_row = DEFAULT_HEADER_ROW
+
+        business_id = None
+        if len(head) >= 3 and len(head[2]) >= 2:
+            m = re.search(r"(\d+)", _cell_text(head[2][1]))
+            if m:
+                business_id = m.group(1)
+
+        headers = _headers_from_rows(head, header_row)
+        col_idx = find_sku_column(headers)
+    except Exception:
+        wb.close()
+        raise
+
+    if col_idx is None:
+        wb.close()
+        sku_column, sku_column_name, values = _iter_skus_with_merged_cells(path, header_row)
+        return XlsxHeader(header_row, sku_column, sku_column_name, business_id, total_rows), values
+
+    header = XlsxHeader(header_row, col_idx + 1, headers[col_idx], business_id, total_rows)
+
+    def generate():
+        try:
+            yield from _iter_column(itertools.chain(head[header_row:], rows_iter), col_idx)
+        finally:
+            wb.close()
+
+    return header, generate()
+
+
+XLSX_BATCH_SIZE = 1000
+
+
+def load_xlsx_skus(path: str, storage: Optional["Storage"] = None, on_header=None, on_batch=None,
+                   on_progress=None, log_fn=None, is_cancelled=None) -> Tuple[XlsxHeader, List[str], bool]:
+    """Разбор выгрузки остатков с кэшем в Storage и очисткой SKU, без зависимости от Qt.
+
+    Колбэки: on_header(XlsxHeader), on_batch(list SKU), on_progress(прочитано строк, всего),
+    log_fn(str); is_cancelled() прерывает чтение. Возвращает (шапка, SKU, из кэша ли).
+    """
+    on_header = on_header or (lambda header: None)
+    on_batch = on_batch or (lambda batch: None)
+    on_progress = on_progress or (lambda done, total: None)
+    log_fn = log_fn or (lambda msg: None)
+    is_cancelled = is_cancelled or (lambda: False)
+
+    st = os.stat(path)
+    content_hash = None
+    if storage:
+        cached = storage.find_xlsx_by_stat(path, st.st_size, st.st_mtime_ns)
+        if cached is None:
+            content_hash = file_content_hash(path)
+            cached = storage.find_xlsx_by_hash(content_hash, path, st.st_size, st.st_mtime_ns)
+        if cached is not None:
+            header, skus = cached
+            on_header(header)
+            for i in range(0, len(skus), XLSX_BATCH_SIZE):
+                if is_cancelled():
+                    break
+                on_batch(skus[i:i + XLSX_BATCH_SIZE])
+            return header, skus, True
+
+    header, sku_values = open_xlsx_skus(path)
+    on_header(header)
+
+    data_rows = max((header.total_rows or 0) - header.header_row, 0)
+    read = 0
+    skus: List[str] = []
+    seen: set = set()
+    blanks = dups = 0
+    try:
+        while not is_cancelled():
+            raw = list(itertools.islice(sku_values, XLSX_BATCH_SIZE))
+            if not raw:
+                break
+            read += len(raw)
+            batch, batch_blanks, batch_dups = clean_sku_batch(raw, seen)
+            blanks += batch_blanks
+            dups += batch_dups
+            if batch:
+                skus.extend(batch)
+                on_batch(batch)
+            on_progress(min(read, data_rows), data_rows)
+    finally:
+        sku_values.close()
+
+    if blanks or dups:
+        log_fn(f"Очистка SKU: убрано пустых — {blanks}, дубликатов — {dups}")
+
+    if storage and content_hash and skus and not is_cancelled():
+        try:
+            storage.save_xlsx_cache(content_hash, path, st.st_size, st.st_mtime_ns, header, skus)
+        except Exception as e:
+            log_fn(f"Не удалось сохранить кэш XLSX: {e}")
+
+    return header, skus, False
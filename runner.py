@@ -0,0 +1,548 @@
+"""Пакетная обработка SKU без зависимости от Qt (используется и GUI, и командной строкой)"""
+import collections
+import heapq
+import itertools
+import os
+import queue
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from browser import CaptchaError, SkuResult, YandexMarketPhotoReloaderDriver
+from config import (
+    CAPTCHA_POLL_INTERVAL, CAPTCHA_POLL_MAX_INTERVAL, PHASE_TITLES, PHASES, POOL_MAX_SIZE, PREFETCH_MAX_DEPTH, PROFILES_DIR,
+    RETRY_COUNT, RETRY_DELAY, RETRY_JITTER, RETRY_MAX_DELAY,
+    SKU_RESULT_CAPTCHA, SKU_RESULT_PERMANENT, SKU_RESULT_TRANSIENT,
+    SKU_STATUS_DEFERRED, SKU_STATUS_DONE, SKU_STATUS_FAILED, SKU_STATUS_SKIPPED, THROUGHPUT_WINDOW, WAIT_POLL_INTERVAL,
+)
+from storage import Storage
+
+
+def retry_delay(attempt: int) -> float:
+    """Пауза после attempt-й неудачной попытки: экспоненциальный рост с долей случайности"""
+    delay = min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** (attempt - 1))
+    return delay * (1 - RETRY_JITTER) + random.uniform(0, delay * RETRY_JITTER)
+
+
+class ThroughputStats:
+    """Скорость, ETA и разбивка времени по этапам за прогон.
+
+    Скорость считается по моментам завершения последних window SKU, поэтому
+    ETA быстро подстраивается под замедления (капча, тормоза кабинета).
+    """
+
+    def __init__(self, window: int = THROUGHPUT_WINDOW):
+        self.started = time.monotonic()
+        self._finished_at: "collections.deque[float]" = collections.deque(maxlen=window + 1)
+        self.phase_totals: Dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.total_time = 0.0
+        self.count = 0
+
+    def record(self, phases: Dict[str, float], total: float, finished: bool = True):
+        """finished=False — SKU отложен, его время войдёт в среднее, когда он завершится"""
+        for phase, seconds in phases.items():
+            self.phase_totals[phase] = self.phase_totals.get(phase, 0.0) + seconds
+        self.total_time += total
+        if finished:
+            self._finished_at.append(time.monotonic())
+            self.count += 1
+
+    def rate_per_min(self) -> float:
+        """SKU в минуту по скользящему окну (до заполнения окна — с начала прогона)"""
+        if not self._finished_at:
+            return 0.0
+        if len(self._finished_at) < self._finished_at.maxlen:
+            span, done = self._finished_at[-1] - self.started, len(self._finished_at)
+        else:
+            span, done = self._finished_at[-1] - self._finished_at[0], len(self._finished_at) - 1
+        return done * 60 / span if span > 0 else 0.0
+
+    def eta_seconds(self, remaining: int) -> Optional[float]:
+        rate = self.rate_per_min()
+        return remaining * 60 / rate if rate else None
+
+    def phase_averages(self) -> Dict[str, float]:
+        """Среднее время этапа на один SKU, с"""
+        if not self.count:
+            return {}
+        return {phase: seconds / self.count for phase, seconds in self.phase_totals.items()}
+
+    def phase_summary(self) -> str:
+        averages = self.phase_averages()
+        if not averages:
+            return ""
+        parts = [f"{PHASE_TITLES.get(p, p)} {averages[p]:.1f}" for p in averages if averages[p] >= 0.05]
+        return f"в среднем на SKU {self.total_time / self.count:.1f} с: " + (", ".join(parts) or "—")
+
+
+class ImagePrefetcher(threading.Thread):
+    """Стадия конвейера, которая заранее скачивает исходные картинки.
+
+    В своей сессии браузера открывает карточки следующих SKU, находит src последнего
+    изображения и скачивает его, пока сессии загрузки заняты загрузкой и сохранением
+    предыдущих. Готовые пары (sku, путь или None) кладёт в очередь ready не более
+    чем на depth SKU вперёд. SKU берёт из той же очереди source, что и сессии, —
+    уже взятые сессиями сюда не попадают; поток завершается, когда source пуст.
+    """
+
+    def __init__(self, driver: YandexMarketPhotoReloaderDriver, campaign_id: str, source: "queue.Queue[str]",
+                 depth: int, log_fn, on_captcha, is_aborted):
+        super().__init__(name="image-prefetcher", daemon=True)
+        self.driver = driver
+        self.campaign_id = campaign_id
+        self.source = source
+        self.ready: "queue.Queue[Tuple[str, Optional[str]]]" = queue.Queue(maxsize=depth)
+        self.log = log_fn
+        self.on_captcha = on_captcha
+        self.is_aborted = is_aborted
+
+    def _put(self, item) -> bool:
+        while not self.is_aborted():
+            try:
+                self.ready.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        while not self.is_aborted():
+            try:
+                sku = self.source.get_nowait()
+            except queue.Empty:
+                break
+            path = None
+            try:
+                path = self.driver.resolve_image(self.campaign_id, sku, self.log)
+            except CaptchaError as e:
+                # капча в сессии предзагрузки — ждём решения, SKU уйдёт в загрузку без предзагрузки
+                self.on_captcha(f"[{sku}] Предзагрузка: {e}")
+            except Exception as e:
+                self.log(f"[{sku}] Предзагрузка: ошибка: {e}")
+            if not self._put((sku, path)):
+                break
+
+
+class BatchRunner:
+    """Обработка списка SKU пулом браузерных сессий, без зависимости от Qt.
+
+    Сессия 1 — уже запущенный браузер driver, остальные pool_size - 1 сессий
+    запускаются со своими профилями Chrome и общими сохранёнными cookies, в том же
+    API-режиме и с тем же профилем загрузки страниц, что и driver. Все сессии берут
+    SKU из общей очереди. При prefetch_depth > 0 отдельная сессия ImagePrefetcher
+    заранее скачивает картинки для следующих SKU; сессии её не ждут и, пока готовых
+    картинок нет, берут SKU прямо из очереди.
+
+    SKU с временной ошибкой не повторяется сразу, а откладывается (и в таблицу
+    deferred): освободившиеся после основного прохода сессии повторяют отложенные
+    не раньше паузы retry_delay(). Отложенные и не обработанные в прошлый раз SKU
+    кабинета подхватываются при следующем запуске.
+
+    О ходе работы сообщает через колбэки: log_fn(str), progress_fn(done, total),
+    captcha_fn(str) — при капче, перед ожиданием; сессия сама проверяет, решена ли
+    капча, и продолжает работу, resume_after_captcha() — продолжить без проверки,
+    session_fn(номер сессии, обработано ею, текущий статус),
+    status_fn(список SKU, SKU_STATUS_*) — итог по SKU,
+    stats_fn(ThroughputStats, осталось SKU) — после каждого SKU; вызывается из
+    рабочих потоков, объект статистики общий — читать его сразу, не сохраняя.
+    Замеры по этапам каждого SKU пишутся в storage (таблица sku_timings).
+
+    При self_check перед запуском сессий селекторы профиля проверяются на первой
+    карточке; если какие-то не найдены, обработка не начинается (check_failed).
+    """
+
+    def __init__(self, driver: YandexMarketPhotoReloaderDriver, storage: Storage, campaign_id: str, skus: List[str],
+                 skip_processed: bool, pool_size: int = 1, prefetch_depth: int = 0, headless: bool = False,
+                 self_check: bool = True, log_fn=None, progress_fn=None, captcha_fn=None, session_fn=None, status_fn=None, stats_fn=None):
+        self.driver = driver
+        self.storage = storage
+        self.campaign_id = campaign_id
+        self.skus = skus
+        self.skip_processed = skip_processed
+        self.pool_size = max(1, min(pool_size, POOL_MAX_SIZE))
+        self.prefetch_depth = max(0, min(prefetch_depth, PREFETCH_MAX_DEPTH))
+        self.headless = headless
+        self.self_check = self_check
+        self.check_failed = False
+        self.log = log_fn or (lambda msg: None)
+        self.on_progress = progress_fn or (lambda done, total: None)
+        self.on_captcha = captcha_fn or (lambda msg: None)
+        self.on_session = session_fn or (lambda session, processed, status: None)
+        self.on_status = status_fn or (lambda skus, status: None)
+        self.on_stats = stats_fn or (lambda stats, remaining: None)
+        self.stats = ThroughputStats()
+        self._prefetcher: Optional[ImagePrefetcher] = None
+        self._threads: List[threading.Thread] = []
+        # браузеры, запущенные самим runner (доп. сессии и предзагрузка): их останавливает stop_sessions()
+        self._session_drivers: List[YandexMarketPhotoReloaderDriver] = []
+        self._drivers_lock = threading.Lock()
+        self._abort = False
+        # ожидание капчи: будят resume_after_captcha() и abort()
+        self._captcha_cond = threading.Condition()
+        self._resume_seq = 0
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        # отложенные SKU: куча (когда можно повторять, порядковый номер, sku, сделано попыток)
+        self._deferred: List[Tuple[float, int, str, int]] = []
+        self._deferred_seq = itertools.count()
+        self._deferred_cond = threading.Condition()
+        self._in_flight = 0  # SKU в работе у сессий — их неудача может пополнить отложенные
+        self._done = 0
+        self._total = 0
+        self._done_lock = threading.Lock()
+        self._cookies_shared = False
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def run(self):
+        self.driver.step_timings.clear()
+        self.driver.captcha_checks = 0
+        self.driver.captcha_check_time = 0.0
+        skus = self.skus
+        # Пропуск уже обработанных — одним проходом по БД до начала работы
+        if self.skip_processed:
+            done = self.storage.processed_among(self.campaign_id, skus)
+            if done:
+                skipped = [s for s in skus if s in done]
+                skus = [s for s in skus if s not in done]
+                self.skipped = len(done)
+                self.on_status(skipped, SKU_STATUS_SKIPPED)
+                self.log(f"Пропущено уже обработанных ранее SKU: {len(done)}")
+
+        skus = self._restore_deferred(skus)
+        self._total = len(skus) + len(self._deferred)
+        if self.self_check and self._total and not self._check_selectors(skus + [d[2] for d in self._deferred]):
+            self.check_failed = True
+            return
+        self.stats = ThroughputStats()
+        for sku in skus:
+            self._queue.put(sku)
+
+        try:
+            drivers = [self.driver]
+            extra_drivers = self._start_extra_drivers(min(self.pool_size, self._total) - 1)
+            drivers.extend(extra_drivers)
+
+            prefetch_driver = None
+            if self.prefetch_depth and self._total > 1 and not self._abort:
+                prefetch_driver = self._start_session_driver("предзагрузка", "prefetch")
+            if prefetch_driver:
+                self._prefetcher = ImagePrefetcher(
+                    prefetch_driver, self.campaign_id, self._queue, self.prefetch_depth,
+                    log_fn=prefetch_driver.log,
+                    on_captcha=lambda msg: self._wait_captcha(msg, prefetch_driver),
+                    is_aborted=self.is_aborted,
+                )
+                self._prefetcher.start()
+
+            for session, driver in enumerate(drivers, start=1):
+                t = threading.Thread(target=self._run_session, args=(session, driver), daemon=True)
+                t.start()
+                self._threads.append(t)
+            try:
+                self.join()
+            except KeyboardInterrupt:
+                # Ctrl+C в консоли: браузеры и хранилище закрываются только после того,
+                # как сессии доделают текущий SKU и выйдут
+                self.abort()
+                self.join()
+                raise
+            self._prefetcher = None
+
+            for session, driver in enumerate(drivers, start=1):
+                summary = driver.timing_summary()
+                if summary:
+                    prefix = f"[сессия {session}] " if len(drivers) > 1 else ""
+                    self.log(f"{prefix}Время ожиданий — {summary}")
+            if self.stats.count:
+                self.log(f"Этапы, {self.stats.phase_summary()}")
+        finally:
+            # браузеры закрываются здесь, в потоке run(), когда сессии их уже не используют
+            self.stop_sessions()
+            # прерывание или конец прохода — всё подтверждённое сразу на диск
+            self.storage.flush()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт выхода потоков сессий и предзагрузки; False — не вышли за timeout секунд.
+
+        Опросом is_alive(), а не Thread.join(): join, прерванный Ctrl+C, может потом
+        считать поток завершённым, пока тот ещё пишет в хранилище.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        threads = self._threads + ([self._prefetcher] if self._prefetcher else [])
+        while any(t.is_alive() for t in threads):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(WAIT_POLL_INTERVAL)
+        return True
+
+    def _check_selectors(self, skus: List[str]) -> bool:
+        """Проверка селекторов профиля; False — часть не найдена и запускать обработку нельзя"""
+        ui = self.driver.ui
+        for _ in range(2):
+            try:
+                problems = self.driver.self_check(self.campaign_id, skus)
+                break
+            except CaptchaError as e:
+                self._wait_captcha(f"Проверка селекторов: {e}", self.driver)
+                if self._abort:
+                    return False
+            except Exception as e:
+                # проверка вспомогательная — её сбой не должен мешать работе
+                self.log(f"Проверка селекторов не удалась: {e}")
+                return True
+        else:
+            return True
+        if not problems:
+            self.log(f"Проверка селекторов профиля {ui.name}: все на месте")
+            return True
+        self.log(f"Проверка селекторов профиля {ui.name} ({ui.base_url}) — не найдены:")
+        for name, problem in problems.items():
+            self.log(f"  {name} = {ui.selectors[name]!r}: {problem}")
+        self.log("Обработка не запущена: поправьте селекторы в ui_profile.json или отключите проверку")
+        return False
+
+    def _restore_deferred(self, skus: List[str]) -> List[str]:
+        """Отложенные в прошлых запусках SKU — в очередь повторов; возвращает SKU основного прохода"""
+        # только SKU загруженного файла: остальные остаются в таблице до запуска со своим файлом
+        wanted = set(self.skus)
+        saved = [(sku, attempts) for sku, attempts in self.storage.load_deferred(self.campaign_id) if sku in wanted]
+        if not saved:
+            return skus
+        done = self.storage.processed_among(self.campaign_id, [sku for sku, _ in saved])
+        if done:
+            self.storage.remove_deferred(self.campaign_id, list(done))
+        restored = {sku: attempts for sku, attempts in saved if sku not in done}
+        for sku, attempts in restored.items():
+            self._push_deferred(sku, attempts, 0.0)
+        if restored:
+            self.on_status(list(restored), SKU_STATUS_DEFERRED)
+            self.log(f"Отложенных с прошлого запуска SKU: {len(restored)} — повторим после основного прохода")
+        return [s for s in skus if s not in restored]
+
+    def _push_deferred(self, sku: str, attempts: int, delay: float):
+        with self._deferred_cond:
+            heapq.heappush(self._deferred, (time.monotonic() + delay, next(self._deferred_seq), sku, attempts))
+            self._deferred_cond.notify_all()
+
+    def _next_deferred(self) -> Optional[Tuple[str, int]]:
+        """Отложенный SKU, пауза которого истекла; None — повторять больше нечего"""
+        with self._deferred_cond:
+            while not self._abort:
+                if self._deferred:
+                    wait = self._deferred[0][0] - time.monotonic()
+                    if wait <= 0:
+                        _, _, sku, attempts = heapq.heappop(self._deferred)
+                        self._in_flight += 1
+                        return sku, attempts
+                elif not self._in_flight:
+                    return None
+                else:
+                    # другие сессии ещё работают — их SKU может оказаться отложенным
+                    wait = 0.5
+                self._deferred_cond.wait(min(wait, 0.5))
+        return None
+
+    def _start_extra_drivers(self, count: int) -> List[YandexMarketPhotoReloaderDriver]:
+        drivers = []
+        for session in range(2, count + 2):
+            if self._abort:
+                break
+            # API-режим — как у основного браузера; предзагрузке он не нужен
+            driver = self._start_session_driver(f"сессия {session}", f"session_{session}", api_mode=self.driver.api_mode)
+            if driver:
+                drivers.append(driver)
+        return drivers
+
+    def _start_session_driver(self, label: str, profile: str, api_mode: bool = False) -> Optional[YandexMarketPhotoReloaderDriver]:
+        """Отдельный браузер со своим профилем, вход по cookies основного браузера"""
+        if not self._cookies_shared:
+            self.driver.save_cookies()
+            self._cookies_shared = True
+        log = lambda msg: self.log(f"[{label}] {msg}")
+        driver = YandexMarketPhotoReloaderDriver(log, profile_dir=os.path.join(PROFILES_DIR, profile), headless=self.headless,
+                                                 api_mode=api_mode, perf_profile=self.driver.perf_profile)
+        try:
+            driver.start()
+            driver.load_cookies()
+        except Exception as e:
+            log(f"Не удалось запустить браузер: {e}")
+            driver.stop()
+            return None
+        with self._drivers_lock:
+            # после abort() браузер уже не понадобится — не ждём конца run(), останавливаем сразу
+            if not self._abort:
+                self._session_drivers.append(driver)
+                return driver
+        driver.stop()
+        return None
+
+    def stop_sessions(self):
+        """Останавливает браузеры доп. сессий и предзагрузки; основной driver не трогает"""
+        with self._drivers_lock:
+            drivers, self._session_drivers = self._session_drivers, []
+        for driver in drivers:
+            driver.stop()
+
+    def _wait_captcha(self, msg: str, driver: YandexMarketPhotoReloaderDriver):
+        """Ждёт, пока капча в driver не исчезнет, resume_after_captcha() или abort().
+
+        Состояние капчи проверяется той же дешёвой проверкой, что и перед SKU,
+        с растущим интервалом от CAPTCHA_POLL_INTERVAL до CAPTCHA_POLL_MAX_INTERVAL.
+        """
+        with self._captcha_cond:
+            seq = self._resume_seq
+        self.on_captcha(msg)
+        interval = CAPTCHA_POLL_INTERVAL
+        while True:
+            with self._captcha_cond:
+                self._captcha_cond.wait_for(lambda: self._abort or self._resume_seq != seq, timeout=interval)
+                if self._abort or self._resume_seq != seq:
+                    return
+            if not driver._is_captcha():
+                driver.log("Капча решена — продолжаем")
+                return
+            interval = min(interval * 2, CAPTCHA_POLL_MAX_INTERVAL)
+
+    def _next_sku(self) -> Optional[Tuple[str, Optional[str]]]:
+        """Следующий SKU и путь к заранее скачанной картинке (если есть предзагрузка).
+
+        Предзагрузка не обязательна: пока готовых картинок нет, сессия берёт SKU прямо
+        из общей очереди и не ждёт единственный браузер предзагрузки.
+        """
+        prefetcher = self._prefetcher
+        while not self._abort:
+            if prefetcher is not None:
+                try:
+                    return prefetcher.ready.get_nowait()
+                except queue.Empty:
+                    pass
+            try:
+                return self._queue.get_nowait(), None
+            except queue.Empty:
+                pass
+            # очередь пуста; остались только SKU, которые сейчас скачивает предзагрузка
+            if prefetcher is None or (not prefetcher.is_alive() and prefetcher.ready.empty()):
+                return None
+            try:
+                return prefetcher.ready.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+
+    def _run_session(self, session: int, driver: YandexMarketPhotoReloaderDriver):
+        prefix = f"[сессия {session}] " if self.pool_size > 1 else ""
+        log = lambda msg: self.log(prefix + msg)
+        processed = 0
+        main_done = False
+        while not self._abort:
+            item = None if main_done else self._next_sku()
+            if item is not None:
+                sku, prefetched_path = item
+                attempts = 0
+                with self._deferred_cond:
+                    self._in_flight += 1
+            else:
+                # основной проход закончился — берём отложенные
+                main_done = True
+                retry = self._next_deferred()
+                if retry is None:
+                    break
+                (sku, attempts), prefetched_path = retry, None
+            was_deferred = attempts > 0
+            self.on_session(session, processed, sku)
+
+            try:
+                driver.sku_timings = {}
+                started = time.perf_counter()
+                attempts, result = self._attempt(driver, sku, prefetched_path, attempts, prefix, log)
+                success = result.ok
+                elapsed = time.perf_counter() - started
+                defer = (result.outcome == SKU_RESULT_TRANSIENT and attempts < RETRY_COUNT and not self._abort)
+
+                if not self._abort:
+                    self.storage.add_timing(self.campaign_id, sku, session, attempts, success, driver.sku_timings, elapsed)
+                if success:
+                    self.storage.add_processed(self.campaign_id, sku)
+                    processed += 1
+                    log(f"[{sku}] УСПЕХ — отмечен как обработанный")
+                elif result.outcome == SKU_RESULT_PERMANENT:
+                    log(f"[{sku}] НЕ УДАЛОСЬ обработать: {result.reason} — без повторов")
+                elif defer:
+                    delay = retry_delay(attempts)
+                    self.storage.save_deferred(self.campaign_id, sku, attempts, result.reason)
+                    self._push_deferred(sku, attempts, delay)
+                    log(f"[{sku}] Отложен ({result.reason}): повтор после основного прохода, не раньше чем через {delay:.0f} с")
+                elif not self._abort:
+                    log(f"[{sku}] НЕ УДАЛОСЬ обработать после {attempts} попыток")
+                if was_deferred and not defer and not self._abort:
+                    self.storage.remove_deferred(self.campaign_id, [sku])
+                if prefetched_path:
+                    YandexMarketPhotoReloaderDriver._remove_spool_file(prefetched_path)
+                if success:
+                    self.on_status([sku], SKU_STATUS_DONE)
+                elif defer:
+                    self.on_status([sku], SKU_STATUS_DEFERRED)
+                elif not self._abort:
+                    self.on_status([sku], SKU_STATUS_FAILED)
+            finally:
+                with self._deferred_cond:
+                    self._in_flight -= 1
+                    self._deferred_cond.notify_all()
+
+            if defer:
+                with self._done_lock:
+                    self.stats.record(driver.sku_timings, elapsed, finished=False)
+                continue
+            with self._done_lock:
+                if success:
+                    self.succeeded += 1
+                elif not self._abort:
+                    self.failed += 1
+                self._done += 1
+                done = self._done
+                if not self._abort:
+                    self.stats.record(driver.sku_timings, elapsed)
+                self.on_stats(self.stats, self._total - done)
+            self.on_progress(done, self._total)
+
+        self.on_session(session, processed, "завершена")
+
+    def _attempt(self, driver: YandexMarketPhotoReloaderDriver, sku: str, prefetched_path: Optional[str],
+                 attempts: int, prefix: str, log) -> Tuple[int, SkuResult]:
+        """Одна попытка обработать SKU; возвращает число сделанных попыток и итог.
+
+        Капча попыткой не считается: после её решения тот же SKU обрабатывается заново.
+        """
+        while True:
+            try:
+                # Проверка капчи заранее
+                if driver._is_captcha():
+                    self._wait_captcha(f"{prefix}Обнаружена капча. Решите её в открытом браузере — обработка продолжится сама.", driver)
+                if self._abort:
+                    return attempts, SkuResult(SKU_RESULT_CAPTCHA, "прервано во время капчи")
+
+                log(f"[{sku}] Попытка {attempts + 1}/{RETRY_COUNT}")
+                result = driver.process_sku(self.campaign_id, sku, log, prefetched_path)
+            except Exception as e:
+                log(f"[{sku}] Ошибка: {e}")
+                result = SkuResult(SKU_RESULT_TRANSIENT, str(e))
+            if result.outcome != SKU_RESULT_CAPTCHA:
+                return attempts + 1, result
+            # капча — не вина карточки: попытку не засчитываем, после решения повторяем SKU
+            self._wait_captcha(prefix + result.reason, driver)
+
+    def resume_after_captcha(self):
+        with self._captcha_cond:
+            self._resume_seq += 1
+            self._captcha_cond.notify_all()
+
+    def abort(self):
+        """Просит сессии остановиться; браузеры закрывает сам run() перед выходом, вызывающий поток не ждёт"""
+        with self._captcha_cond:
+            self._abort = True
+            self._captcha_cond.notify_all()
+
+    def is_aborted(self) -> bool:
+        return self._abort
@@ -0,0 +1,330 @@
+"""SQLite-хранилище: обработанные и отложенные SKU, кабинеты, кэш разобранных XLSX, замеры времени"""
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    DB_FILE, FLUSH_EVERY_ITEMS, FLUSH_INTERVAL_SEC, PHASES, XLSX_CACHE_MAX_AGE_DAYS, XLSX_CACHE_MAX_ENTRIES,
+)
+from parser import XlsxHeader
+
+
+@dataclass
+class Cabinet:
+    business_id: str 
+    name: str
+    dashboard_href: str  # /business/{id}/dashboard?view=marketplace
+
+
+class Storage:
+    """SQLite-хранилище.
+
+    В режиме write_behind успешные SKU из add_processed копятся в памяти и
+    записываются одной транзакцией каждые flush_every штук или flush_interval
+    секунд (фоновым потоком), а также при flush()/close(). Замеры из add_timing
+    пишутся тем же сбросом.
+    """
+
+    def __init__(self, path: str = DB_FILE, write_behind: bool = True,
+                 flush_every: int = FLUSH_EVERY_ITEMS, flush_interval: float = FLUSH_INTERVAL_SEC):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+        self.lock = threading.Lock()
+
+        self.write_behind = write_behind
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[str, str], None] = {}  # упорядоченное множество (campaign_id, sku)
+        self._pending_timings: List[tuple] = []
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher: Optional[threading.Thread] = None
+        if write_behind:
+            self._flusher = threading.Thread(target=self._flush_loop, name="storage-flusher", daemon=True)
+            self._flusher.start()
+
+    def _init_schema(self):
+        cur = self.conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS processed (
+                campaign_id TEXT NOT NULL,
+                sku TEXT NOT NULL,
+                processed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (campaign_id, sku)
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS deferred (
+                campaign_id TEXT NOT NULL,
+                sku TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                last_error TEXT,
+                deferred_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (campaign_id, sku)
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cabinets (
+                business_id TEXT PRIMARY KEY,
+                name TEXT,
+                dashboard_href TEXT
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS xlsx_cache (
+                content_hash TEXT PRIMARY KEY,
+                path TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                header_row INTEGER,
+                sku_column INTEGER,
+                sku_column_name TEXT,
+                business_id TEXT,
+                skus TEXT,
+                last_used_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS xlsx_cache_file ON xlsx_cache (path, size, mtime_ns)")
+        phase_columns = "".join(f"{p} REAL, " for p in PHASES)
+        cur.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS sku_timings (
+                campaign_id TEXT NOT NULL,
+                sku TEXT NOT NULL,
+                finished_at REAL NOT NULL,
+                session INTEGER,
+                attempts INTEGER,
+                success INTEGER,
+                {phase_columns}total REAL
+            )
+            """
+        )
+        # таблица могла быть создана версией с другим набором этапов
+        existing = {r[1] for r in cur.execute("PRAGMA table_info(sku_timings)")}
+        for p in PHASES:
+            if p not in existing:
+                cur.execute(f"ALTER TABLE sku_timings ADD COLUMN {p} REAL")
+        self.conn.commit()
+
+    def add_processed(self, campaign_id: str, sku: str):
+        with self.lock:
+            # после close() копить нельзя — сбрасывать будет некому; пишем сразу
+            # (на закрытом соединении это sqlite3.ProgrammingError, а не тихая потеря)
+            if not self.write_behind or self._closed:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO processed (campaign_id, sku) VALUES (?, ?)",
+                    (campaign_id, sku),
+                )
+                self.conn.commit()
+                return
+            self._pending[(campaign_id, sku)] = None
+            pending = len(self._pending)
+        if pending >= self.flush_every:
+            self._wake.set()
+
+    def add_timing(self, campaign_id: str, sku: str, session: int, attempts: int, success: bool,
+                   phases: Dict[str, float], total: float):
+        """Замер времени по этапам одного SKU (секунды, все попытки вместе)"""
+        row = (campaign_id, sku, time.time(), session, attempts, int(success),
+               *(phases.get(p, 0.0) for p in PHASES), total)
+        with self.lock:
+            self._pending_timings.append(row)
+            if not self.write_behind or self._closed:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending and not self._pending_timings:
+            return
+        if self._pending:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO processed (campaign_id, sku) VALUES (?, ?)",
+                list(self._pending),
+            )
+        if self._pending_timings:
+            columns = ", ".join(("campaign_id", "sku", "finished_at", "session", "attempts", "success", *PHASES, "total"))
+            placeholders = ", ".join("?" * (len(PHASES) + 7))
+            self.conn.executemany(
+                f"INSERT INTO sku_timings ({columns}) VALUES ({placeholders})",
+                self._pending_timings,
+            )
+        self.conn.commit()
+        self._pending.clear()
+        self._pending_timings.clear()
+
+    def flush(self):
+        """Записывает накопленные SKU и замеры одной транзакцией"""
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                # БД занята/недоступна — попробуем на следующем цикле, данные остаются в очереди
+                pass
+
+    def close(self):
+        """Сбрасывает накопленное и закрывает БД; дальнейшие записи не копятся, а падают"""
+        self._closed = True
+        self._wake.set()
+        if self._flusher:
+            self._flusher.join(timeout=5)
+        with self.lock:
+            self._flush_locked()
+            self.conn.close()
+
+    def is_processed(self, campaign_id: str, sku: str) -> bool:
+        with self.lock:
+            if (campaign_id, sku) in self._pending:
+                return True
+            row = self.conn.execute(
+                "SELECT 1 FROM processed WHERE campaign_id=? AND sku=?",
+                (campaign_id, sku),
+            ).fetchone()
+            return row is not None
+
+    def processed_among(self, campaign_id: str, skus: List[str], chunk_size: int = 500) -> set:
+        """Какие из skus уже обработаны — пачками через IN вместо запроса на каждый SKU"""
+        found = set()
+        with self.lock:
+            wanted = set(skus)
+            found.update(s for c, s in self._pending if c == campaign_id and s in wanted)
+            for i in range(0, len(skus), chunk_size):
+                chunk = skus[i:i + chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT sku FROM processed WHERE campaign_id=? AND sku IN ({placeholders})",
+                    (campaign_id, *chunk),
+                ).fetchall()
+                found.update(r[0] for r in rows)
+        return found
+
+    def bulk_mark_processed(self, campaign_id: str, skus: List[str]):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO processed (campaign_id, sku) VALUES (?, ?)",
+                [(campaign_id, s) for s in skus],
+            )
+            self.conn.commit()
+
+    # ---- Отложенные SKU (повтор после основного прохода) ----
+    def save_deferred(self, campaign_id: str, sku: str, attempts: int, last_error: str):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO deferred (campaign_id, sku, attempts, last_error) VALUES (?, ?, ?, ?)",
+                (campaign_id, sku, attempts, last_error),
+            )
+            self.conn.commit()
+
+    def remove_deferred(self, campaign_id: str, skus: List[str]):
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM deferred WHERE campaign_id=? AND sku=?",
+                [(campaign_id, s) for s in skus],
+            )
+            self.conn.commit()
+
+    def load_deferred(self, campaign_id: str) -> List[Tuple[str, int]]:
+        """Отложенные SKU кабинета с числом уже сделанных попыток, в порядке откладывания"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT sku, attempts FROM deferred WHERE campaign_id=? ORDER BY deferred_at, rowid",
+                (campaign_id,),
+            ).fetchall()
+        return [(sku, attempts) for sku, attempts in rows]
+
+    def save_cabinets(self, cabinets: List[Cabinet]):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO cabinets (business_id, name, dashboard_href) VALUES (?, ?, ?)",
+                [(c.business_id, c.name, c.dashboard_href) for c in cabinets],
+            )
+            self.conn.commit()
+
+    def load_cabinets(self) -> List[Cabinet]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT business_id, name, dashboard_href FROM cabinets"
+            ).fetchall()
+        return [Cabinet(*r) for r in rows]
+
+    # ---- Кэш разобранных XLSX ----
+    _XLSX_CACHE_COLUMNS = "content_hash, header_row, sku_column, sku_column_name, business_id, skus"
+
+    def _xlsx_cache_hit(self, row) -> Tuple[XlsxHeader, List[str]]:
+        content_hash, header_row, sku_column, sku_column_name, business_id, skus = row
+        self.conn.execute(
+            "UPDATE xlsx_cache SET last_used_at=CURRENT_TIMESTAMP WHERE content_hash=?", (content_hash,)
+        )
+        self.conn.commit()
+        return XlsxHeader(header_row, sku_column, sku_column_name, business_id), json.loads(skus)
+
+    def find_xlsx_by_stat(self, path: str, size: int, mtime_ns: int) -> Optional[Tuple[XlsxHeader, List[str]]]:
+        """Быстрая проверка без чтения файла: тот же путь, размер и mtime"""
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {self._XLSX_CACHE_COLUMNS} FROM xlsx_cache WHERE path=? AND size=? AND mtime_ns=?",
+                (path, size, mtime_ns),
+            ).fetchone()
+            return self._xlsx_cache_hit(row) if row else None
+
+    def find_xlsx_by_hash(self, content_hash: str, path: str, size: int, mtime_ns: int) -> Optional[Tuple[XlsxHeader, List[str]]]:
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {self._XLSX_CACHE_COLUMNS} FROM xlsx_cache WHERE content_hash=?",
+                (content_hash,),
+            ).fetchone()
+            if not row:
+                return None
+            # файл переименовали/скопировали — запоминаем новые путь и mtime для префильтра
+            self.conn.execute(
+                "UPDATE xlsx_cache SET path=?, size=?, mtime_ns=? WHERE content_hash=?",
+                (path, size, mtime_ns, content_hash),
+            )
+            return self._xlsx_cache_hit(row)
+
+    def save_xlsx_cache(self, content_hash: str, path: str, size: int, mtime_ns: int,
+                        header: XlsxHeader, skus: List[str]):
+        with self.lock:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO xlsx_cache
+                    (content_hash, path, size, mtime_ns, header_row, sku_column, sku_column_name, business_id, skus)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (content_hash, path, size, mtime_ns, header.header_row, header.sku_column,
+                 header.sku_column_name, header.business_id, json.dumps(skus, ensure_ascii=False)),
+            )
+            self._evict_xlsx_cache()
+            self.conn.commit()
+
+    def _evict_xlsx_cache(self):
+        """Удаляет записи старше XLSX_CACHE_MAX_AGE_DAYS и всё сверх XLSX_CACHE_MAX_ENTRIES (LRU)"""
+        self.conn.execute(
+            "DELETE FROM xlsx_cache WHERE last_used_at < datetime('now', ?)",
+            (f"-{XLSX_CACHE_MAX_AGE_DAYS} days",),
+        )
+        self.conn.execute(
+            """
+            DELETE FROM xlsx_cache WHERE content_hash NOT IN (
+                SELECT content_hash FROM xlsx_cache ORDER BY last_used_at DESC LIMIT ?
+            )
+            """,
+            (XLSX_CACHE_MAX_ENTRIES,),
+        )
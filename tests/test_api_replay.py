@@ -0,0 +1,96 @@
+"""Проверка API-режима на запросах, записанных так, как их отдаёт сетевой лог Chrome"""
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_replay import UnsafeReplay, build_replay_template, parse_performance_log  # noqa: E402
+
+PAGE_URL = "https://partner.market.yandex.ru/business/100/assortment/offer-card?campaignId=200&article={sku}"
+BOUNDARY = "----WebKitFormBoundaryX"
+
+
+def _entry(method: str, **params) -> dict:
+    return {"message": json.dumps({"message": {"method": method, "params": params}})}
+
+
+def _capture(sku: str, image_id: str, card_id: int = 7, pictures=()):
+    """Сетевой лог загрузки и сохранения фото для sku: (запросы загрузки, запросы сохранения)"""
+    body = (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"campaignId\"\r\n\r\n200\r\n"
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"orig.webp\"\r\n"
+        f"Content-Type: image/webp\r\n\r\n<binary>\r\n--{BOUNDARY}--\r\n"
+    )
+    save = {"campaignId": 200, "offerId": sku, "cardId": card_id, "picture": {"id": image_id}}
+    if pictures:
+        save["pictures"] = list(pictures)
+    save_body = json.dumps(save)
+    log = [
+        _entry("Network.requestWillBeSent", requestId="1", request={
+            "method": "GET", "url": PAGE_URL.format(sku=sku), "headers": {}}),
+        _entry("Network.requestWillBeSent", requestId="2", request={
+            "method": "POST", "url": "https://partner.market.yandex.ru/api/upload-picture",
+            "headers": {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}", "X-Csrf-Token": "t1"},
+            "postData": body}),
+        _entry("Network.responseReceived", requestId="2", response={"status": 200}),
+        _entry("Network.requestWillBeSent", requestId="3", request={
+            "method": "POST", "url": f"https://partner.market.yandex.ru/api/offers/{sku}/pictures",
+            "headers": {"Content-Type": "application/json", "Referer": PAGE_URL.format(sku=sku)},
+            "postData": save_body}),
+        _entry("Network.responseReceived", requestId="3", response={"status": 200}),
+    ]
+    requests = parse_performance_log(log)
+    requests[0].response_body = json.dumps({"result": {"id": image_id, "url": f"//avatars.mds.yandex.net/get/{image_id}/orig"}})
+    return requests[:1], requests[1:]
+
+
+def _template(sku: str, image_id: str, card_id: int = 7, pictures=()):
+    upload, save = _capture(sku, image_id, card_id, pictures)
+    return build_replay_template("200", sku, PAGE_URL.format(sku=sku), upload, save, list(pictures))
+
+
+class ParsePerformanceLogTest(unittest.TestCase):
+    def test_keeps_requests_with_body_and_status(self):
+        upload, save = _capture("SKU-1", "img-aaaa11")
+        self.assertEqual([r.method for r in upload + save], ["POST", "POST"])
+        self.assertTrue(all(r.ok for r in upload + save))
+        self.assertTrue(upload[0].content_type.startswith("multipart/"))
+
+
+class ReplayTemplateTest(unittest.TestCase):
+    def test_two_skus_match_and_render_for_third(self):
+        first = _template("SKU-1", "img-aaaa11")
+        second = _template("SKU/2", "img-bbbb22")
+        self.assertTrue(first.matches(second))
+        self.assertFalse(first.matches(first))
+
+        upload = first.upload.render("NEW 3")
+        self.assertEqual(upload["method"], "POST")
+        self.assertEqual(first.upload.file_field, "file")
+        self.assertIn(("campaignId", "200"), upload["data"])
+
+        save = first.save[0].render("NEW 3", {"result": {"id": "img-cccc33"}})
+        self.assertEqual(save["url"], "https://partner.market.yandex.ru/api/offers/NEW%203/pictures")
+        self.assertEqual(json.loads(save["data"]),
+                         {"campaignId": 200, "offerId": "NEW 3", "cardId": 7, "picture": {"id": "img-cccc33"}})
+        self.assertIn("NEW%203", save["headers"]["Referer"])
+
+    def test_card_specific_value_does_not_match(self):
+        # внутренний id карточки в запросе не выводится из SKU — повторять такой запрос нельзя
+        self.assertFalse(_template("SKU-1", "img-aaaa11", card_id=7).matches(_template("SKU-2", "img-bbbb22", card_id=8)))
+
+    def test_missing_upload_field_in_response(self):
+        template = _template("SKU-1", "img-aaaa11")
+        with self.assertRaises(ValueError):
+            template.save[0].render("SKU-3", {"result": {}})
+
+    def test_save_with_card_pictures_is_unsafe(self):
+        # запрос переписывает весь список фото карточки — для другого SKU он затёр бы его фото
+        with self.assertRaises(UnsafeReplay):
+            _template("SKU-1", "img-aaaa11", pictures=["https://avatars.mds.yandex.net/get/img-aaaa11/orig"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Проверка списка блокируемых адресов облегчённого профиля: фото товаров и страницы кабинета не блокируются"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import browser  # noqa: E402
+from browser import _url_pattern_matches, blocked_url_patterns  # noqa: E402
+
+CABINETS = ("https://partner.market.yandex.ru", "http://127.0.0.1:8765")
+PHOTOS = (
+    "https://avatars.mds.yandex.net/get-mpic/1234567/img_id890/orig",
+    "https://avatars.mds.yandex.net/get-mpic/1234567/img_id890/50x50.jpg",
+)
+
+
+def cabinet_pages(base: str):
+    return (
+        base + "/",
+        base + "/business/123/settings?activeTab=all",
+        base + "/supplier/456/assortment/offer-card?article=SKU-1.jpg&source=businessStocks",
+        base + "/api/offer-card/save",
+    )
+
+
+def patterns_for(base: str):
+    return blocked_url_patterns(base, (base + "/",))
+
+
+def blocked(patterns, url: str) -> bool:
+    return any(_url_pattern_matches(pattern, url) for pattern in patterns)
+
+
+class BlockedUrlPatternsTest(unittest.TestCase):
+    def setUp(self):
+        blocked_url_patterns.cache_clear()
+        self.addCleanup(blocked_url_patterns.cache_clear)
+
+    def test_photos_and_cabinet_pages_are_never_blocked(self):
+        for base in CABINETS:
+            patterns = patterns_for(base)
+            for url in PHOTOS + cabinet_pages(base):
+                with self.subTest(base=base, url=url):
+                    self.assertFalse(blocked(patterns, url))
+
+    def test_fonts_and_metrika_stay_blocked(self):
+        for base in CABINETS:
+            patterns = patterns_for(base)
+            for url in (
+                "https://mc.yandex.ru/watch/12345",
+                base + "/metrika/tag.js",
+                "https://yastatic.net/s3/fonts/ys-text.woff2",
+                base + "/static/fonts/ys-text.woff2",
+            ):
+                with self.subTest(base=base, url=url):
+                    self.assertTrue(blocked(patterns, url))
+
+    def test_patterns_that_could_hit_kept_hosts_are_dropped(self):
+        risky = ("*://*.yandex.net/*", "*.jpg*", "*://{cabinet}/*", "*://avatars.mds.yandex.net/*.png")
+        with mock.patch.object(browser, "PERF_BLOCKED_URLS", browser.PERF_BLOCKED_URLS + risky):
+            for base in CABINETS:
+                blocked_url_patterns.cache_clear()
+                patterns = patterns_for(base)
+                with self.subTest(base=base):
+                    for pattern in risky:
+                        self.assertNotIn(pattern.replace("{cabinet}", base.split("://")[1]), patterns)
+                    self.assertIn("*://yastatic.net/*.woff*", patterns)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+"""Проверка BatchRunner без браузера: откладывание SKU, паузы повторов, капча и отложенные с прошлого запуска"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import runner  # noqa: E402
+from browser import SkuResult  # noqa: E402
+from config import (  # noqa: E402
+    RETRY_COUNT, RETRY_DELAY, RETRY_MAX_DELAY,
+    SKU_RESULT_CAPTCHA, SKU_RESULT_PERMANENT, SKU_RESULT_SUCCESS, SKU_RESULT_TRANSIENT, SKU_STATUS_DEFERRED,
+)
+from runner import BatchRunner  # noqa: E402
+from storage import Storage  # noqa: E402
+
+OK = SkuResult(SKU_RESULT_SUCCESS)
+TIMEOUT = SkuResult(SKU_RESULT_TRANSIENT, "таймаут")
+NO_PHOTO = SkuResult(SKU_RESULT_PERMANENT, "нет фото")
+CAPTCHA = SkuResult(SKU_RESULT_CAPTCHA, "капча")
+
+
+class FakeDriver:
+    """Вместо браузера: исходы process_sku по SKU по очереди (последний повторяется), по умолчанию — успех"""
+
+    api_mode = False
+    perf_profile = False
+
+    def __init__(self, outcomes=None):
+        self.outcomes = {sku: list(results) for sku, results in (outcomes or {}).items()}
+        self.calls = []
+        self.step_timings = {}
+        self.captcha_checks = 0
+        self.captcha_check_time = 0.0
+        self.sku_timings = {}
+        self.lock = threading.Lock()
+
+    def log(self, msg):
+        pass
+
+    def _is_captcha(self):
+        return False
+
+    def process_sku(self, campaign_id, sku, log, prefetched_path=None):
+        with self.lock:
+            self.calls.append(sku)
+            results = self.outcomes.get(sku) or [OK]
+            return results.pop(0) if len(results) > 1 else results[0]
+
+    def timing_summary(self):
+        return ""
+
+    def save_cookies(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class RunnerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.work = tempfile.mkdtemp()
+        self.storage = Storage(os.path.join(self.work, "processed.sqlite3"))
+        self.delays = []
+        # паузы повторов записываем, но не ждём их
+        patcher = mock.patch.object(runner, "retry_delay", side_effect=lambda attempt: self.delays.append(attempt) or 0.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.work, ignore_errors=True)
+
+    def run_batch(self, driver, skus, **kwargs):
+        batch = BatchRunner(driver, self.storage, "1", skus, skip_processed=True, self_check=False, **kwargs)
+        batch.run()
+        return batch
+
+
+class RetryDelayTest(unittest.TestCase):
+    def test_delay_doubles_up_to_max(self):
+        with mock.patch.object(runner, "RETRY_JITTER", 0):
+            delays = [runner.retry_delay(attempt) for attempt in range(1, 8)]
+        expected = [min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** i) for i in range(7)]
+        self.assertEqual(delays, expected)
+        self.assertEqual(delays[-1], RETRY_MAX_DELAY)
+
+    def test_jitter_only_shortens_delay(self):
+        for attempt in range(1, 6):
+            full = min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** (attempt - 1))
+            for _ in range(20):
+                self.assertLessEqual(runner.retry_delay(attempt), full)
+                self.assertGreaterEqual(runner.retry_delay(attempt), full * (1 - runner.RETRY_JITTER))
+
+
+class DeferTest(RunnerTestCase):
+    def test_transient_failure_is_retried_after_main_pass(self):
+        driver = FakeDriver({"A": [TIMEOUT, TIMEOUT, OK]})
+        batch = self.run_batch(driver, ["A", "B", "C"])
+
+        self.assertEqual(driver.calls, ["A", "B", "C", "A", "A"])
+        self.assertEqual(self.delays, [1, 2])
+        self.assertEqual((batch.succeeded, batch.failed), (3, 0))
+        self.assertEqual(self.storage.load_deferred("1"), [])
+        self.assertTrue(self.storage.is_processed("1", "A"))
+
+    def test_permanent_failure_is_not_retried(self):
+        driver = FakeDriver({"B": [NO_PHOTO]})
+        batch = self.run_batch(driver, ["A", "B"])
+
+        self.assertEqual(driver.calls, ["A", "B"])
+        self.assertEqual(self.delays, [])
+        self.assertEqual((batch.succeeded, batch.failed), (1, 1))
+        self.assertEqual(self.storage.load_deferred("1"), [])
+        self.assertFalse(self.storage.is_processed("1", "B"))
+
+    def test_sku_is_dropped_after_retry_count_attempts(self):
+        driver = FakeDriver({"B": [TIMEOUT]})
+        batch = self.run_batch(driver, ["A", "B"])
+
+        self.assertEqual(driver.calls.count("B"), RETRY_COUNT)
+        self.assertEqual(self.delays, list(range(1, RETRY_COUNT)))
+        self.assertEqual((batch.succeeded, batch.failed), (1, 1))
+        self.assertEqual(self.storage.load_deferred("1"), [])
+
+
+class CaptchaTest(RunnerTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(runner, "CAPTCHA_POLL_INTERVAL", 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_captcha_does_not_use_up_attempts(self):
+        driver = FakeDriver({"B": [CAPTCHA] * RETRY_COUNT + [OK]})
+        captchas = []
+        batch = self.run_batch(driver, ["A", "B"], captcha_fn=captchas.append)
+
+        self.assertEqual(driver.calls, ["A"] + ["B"] * (RETRY_COUNT + 1))
+        self.assertEqual(len(captchas), RETRY_COUNT)
+        self.assertEqual((batch.succeeded, batch.failed), (2, 0))
+        self.assertTrue(self.storage.is_processed("1", "B"))
+
+    def test_attempts_after_captcha_keep_their_count(self):
+        driver = FakeDriver({"B": [CAPTCHA] + [TIMEOUT] * (RETRY_COUNT - 1) + [OK]})
+        batch = self.run_batch(driver, ["B"])
+
+        self.assertEqual(driver.calls, ["B"] * (RETRY_COUNT + 1))
+        self.assertEqual(self.delays, list(range(1, RETRY_COUNT)))
+        self.assertEqual(batch.succeeded, 1)
+
+
+class RestoreDeferredTest(RunnerTestCase):
+    def test_deferred_entries_survive_restart(self):
+        # первый запуск прерывается, как только B отложен
+        holder = {}
+
+        def on_status(skus, status):
+            if status == SKU_STATUS_DEFERRED:
+                holder["batch"].abort()
+
+        first = BatchRunner(FakeDriver({"B": [TIMEOUT]}), self.storage, "1", ["A", "B", "C"],
+                            skip_processed=True, self_check=False, status_fn=on_status)
+        holder["batch"] = first
+        first.run()
+        self.assertEqual(self.storage.load_deferred("1"), [("B", 1)])
+
+        # второй запуск: A уже обработан, B — после основного прохода, попытки продолжают счёт
+        driver = FakeDriver({"B": [TIMEOUT]})
+        second = self.run_batch(driver, ["A", "B", "C"])
+        self.assertEqual(driver.calls, ["C"] + ["B"] * (RETRY_COUNT - 1))
+        self.assertEqual((second.skipped, second.succeeded, second.failed), (1, 1, 1))
+        self.assertEqual(self.storage.load_deferred("1"), [])
+
+    def test_deferred_outside_loaded_file_are_kept_for_later(self):
+        self.storage.save_deferred("1", "OTHER", 1, "таймаут")
+        self.storage.save_deferred("2", "A", 1, "таймаут")
+        driver = FakeDriver()
+        statuses = []
+        batch = self.run_batch(driver, ["A"], status_fn=lambda skus, status: statuses.append((skus, status)))
+
+        self.assertEqual(driver.calls, ["A"])
+        self.assertNotIn((["OTHER"], SKU_STATUS_DEFERRED), statuses)
+        self.assertEqual(batch.succeeded, 1)
+        self.assertEqual(self.storage.load_deferred("1"), [("OTHER", 1)])
+        self.assertEqual(self.storage.load_deferred("2"), [("A", 1)])
+
+    def test_restored_sku_already_processed_is_cleared(self):
+        self.storage.save_deferred("1", "A", 1, "таймаут")
+        self.storage.bulk_mark_processed("1", ["A"])
+        driver = FakeDriver()
+        self.run_batch(driver, ["A", "B"])
+
+        self.assertEqual(driver.calls, ["B"])
+        self.assertEqual(self.storage.load_deferred("1"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Проверка хранилища: отложенная запись обработанных SKU и выборка уже обработанных"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import Storage  # noqa: E402
+
+
+class StorageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.work = tempfile.mkdtemp()
+        self.path = os.path.join(self.work, "processed.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.work, ignore_errors=True)
+
+    def on_disk(self, campaign_id: str = "1") -> int:
+        """Сколько SKU кампании уже записано в файл БД (отдельным соединением)"""
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM processed WHERE campaign_id=?", (campaign_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+
+class WriteBehindTest(StorageTestCase):
+    def test_pending_items_are_written_on_close(self):
+        storage = Storage(self.path, flush_every=1000, flush_interval=60)
+        for i in range(10):
+            storage.add_processed("1", f"SKU-{i}")
+        self.assertTrue(storage.is_processed("1", "SKU-3"))
+        self.assertEqual(self.on_disk(), 0)
+        storage.close()
+
+        self.assertEqual(self.on_disk(), 10)
+        reopened = Storage(self.path, write_behind=False)
+        try:
+            self.assertTrue(reopened.is_processed("1", "SKU-9"))
+        finally:
+            reopened.close()
+
+    def test_flush_triggers_at_flush_every(self):
+        storage = Storage(self.path, flush_every=5, flush_interval=60)
+        try:
+            for i in range(4):
+                storage.add_processed("1", f"SKU-{i}")
+            time.sleep(0.2)
+            self.assertEqual(self.on_disk(), 0)
+
+            storage.add_processed("1", "SKU-4")
+            deadline = time.monotonic() + 5
+            while self.on_disk() < 5 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(self.on_disk(), 5)
+        finally:
+            storage.close()
+
+    def test_add_processed_after_close_is_not_lost_silently(self):
+        storage = Storage(self.path)
+        storage.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            storage.add_processed("1", "SKU-1")
+
+
+class ProcessedAmongTest(StorageTestCase):
+    def test_more_skus_than_sqlite_variables(self):
+        storage = Storage(self.path, flush_every=1000, flush_interval=60)
+        try:
+            done = [f"SKU-{i}" for i in range(0, 2500, 2)]
+            storage.bulk_mark_processed("1", done)
+            storage.bulk_mark_processed("2", ["SKU-1"])
+            storage.add_processed("1", "SKU-2501")  # ещё не сброшен на диск
+
+            wanted = [f"SKU-{i}" for i in range(2600)]
+            self.assertEqual(storage.processed_among("1", wanted), set(done) | {"SKU-2501"})
+        finally:
+            storage.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
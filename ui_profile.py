@@ -0,0 +1,81 @@
+"""Профиль адресов и CSS-селекторов кабинета: встроенный из config.UI_PROFILES плюс JSON-файл поверх него"""
+import json
+import os
+import string
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from config import UI_PROFILE, UI_PROFILE_FILE, UI_PROFILES
+
+# параметры, которые можно использовать в шаблонах urls
+URL_PARAMS = ("business_id", "campaign_id", "article")
+
+
+@dataclass(frozen=True)
+class UiProfile:
+    name: str
+    base_url: str
+    urls: Dict[str, str]
+    selectors: Dict[str, str]
+
+    def url(self, name: str, **params) -> str:
+        """Полный адрес страницы name; значения параметров экранируются для URL"""
+        return self.base_url + self.urls[name].format(**{k: quote(str(v), safe="") for k, v in params.items()})
+
+
+def _merge(profile: dict, override: dict, source: str) -> dict:
+    unknown = set(override) - {"base_url", "urls", "selectors"}
+    if unknown:
+        raise ValueError(f"{source}: неизвестные разделы {', '.join(sorted(unknown))}")
+    merged = {"base_url": override.get("base_url", profile["base_url"])}
+    for section in ("urls", "selectors"):
+        extra = override.get(section, {})
+        if not isinstance(extra, dict):
+            raise ValueError(f"{source}: раздел {section} должен быть объектом")
+        merged[section] = {**profile[section], **extra}
+    return merged
+
+
+def _validate(name: str, data: dict):
+    required = UI_PROFILES["market"]
+    for section in ("urls", "selectors"):
+        missing = set(required[section]) - set(data[section])
+        if missing:
+            raise ValueError(f"Профиль {name}: нет {section} {', '.join(sorted(missing))}")
+        for key, value in data[section].items():
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"Профиль {name}: пустое значение {section}.{key}")
+    for key, template in data["urls"].items():
+        fields = {f for _, f, _, _ in string.Formatter().parse(template) if f}
+        unknown = fields - set(URL_PARAMS)
+        if unknown:
+            raise ValueError(f"Профиль {name}: в urls.{key} неизвестные параметры {', '.join(sorted(unknown))}")
+
+
+def load_ui_profile(name: str = UI_PROFILE, path: Optional[str] = UI_PROFILE_FILE,
+                    base_url: Optional[str] = None) -> UiProfile:
+    """Собирает и проверяет профиль; ошибки в профиле или файле — ValueError"""
+    if name not in UI_PROFILES:
+        raise ValueError(f"Неизвестный профиль {name}; есть: {', '.join(UI_PROFILES)}")
+    data = UI_PROFILES[name]
+    if path and os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                override = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            raise ValueError(f"Не удалось прочитать {path}: {e}")
+        if not isinstance(override, dict):
+            raise ValueError(f"{path}: ожидается JSON-объект")
+        data = _merge(data, override, path)
+        name = f"{name}+{os.path.basename(path)}"
+    _validate(name, data)
+    base_url = base_url or os.environ.get("YM_PARTNER_BASE_URL") or data["base_url"]
+    return UiProfile(name, base_url.rstrip("/"), dict(data["urls"]), dict(data["selectors"]))
+
+
+@lru_cache(maxsize=None)
+def get_ui_profile() -> UiProfile:
+    """Профиль текущего запуска: собирается один раз на процесс"""
+    return load_ui_profile()
@@ -1,600 +1,227 @@
+import collections
+import logging
+import logging.handlers
 import sys
-import time
-import re
-import os
-import io
-import sqlite3
-import pickle
-import tempfile
 import threading
-import shutil
-import zipfile
-import requests
-from dataclasses import dataclass
-from typing import List, Optional, Dict, Tuple
-
-import pandas as pd
-import requests
-from openpyxl import load_workbook
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
 from PyQt5 import QtWidgets, QtCore, QtGui
 from PyQt5.QtCore import Qt
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
-from selenium.webdriver.common.action_chains import ActionChains
 
-# ======================
-# Persistent storage
-# ======================
-DB_FILE = "processed_items.sqlite3"
-COOKIES_FILE = "cookies.pkl"
-DEFAULT_WAIT = 20
-RETRY_COUNT = 3
-RETRY_DELAY = 5
-
-SKU_COLUMN_CANDIDATES = [
-    "Ваш SKU *", "Ваш SKU", "SKU", "Артикул", "Артикул продавца", "Article"
-]
-
-def get_chrome_version():
-    """Определяем версию установленного Chrome"""
-    try:
-        # Для Windows
-        process = subprocess.run(
-            r'reg query "HKEY_CURRENT_USER\Software\Google\Chrome\BLBeacon" /v version',
-            capture_output=True, text=True, shell=True
-        )
-        output = process.stdout
-        if "version" in output.lower():
-            return output.strip().split()[-1]
-    except Exception as e:
-        print(f"Не удалось получить версию Chrome: {e}")
-    return None
-
-
-def download_chromedriver(chrome_version, driver_dir):
-    """Скачиваем chromedriver под версию Chrome"""
-    major_version = chrome_version.split(".")[0]
-
-    # Узнаем последнюю совместимую версию драйвера
-    url = f"https://chromedriver.storage.googleapis.com/LATEST_RELEASE_{major_version}"
-    response = requests.get(url)
-    driver_version = response.text.strip()
-
-    # Скачиваем zip с драйвером
-    zip_url = f"https://chromedriver.storage.googleapis.com/{driver_version}/chromedriver_win32.zip"
-    zip_path = os.path.join(driver_dir, "chromedriver.zip")
-
-    print(f"Скачиваю ChromeDriver {driver_version}...")
-    with open(zip_path, "wb") as f:
-        f.write(response.content)
-
-    # Распаковываем
-    with zipfile.ZipFile(zip_path, "r") as zip_ref:
-        zip_ref.extractall(driver_dir)
-    os.remove(zip_path)
-
-
-def get_driver():
-    """Возвращает Selenium WebDriver с автоскачиванием chromedriver"""
-    # if getattr(sys, 'frozen', False):  # exe через PyInstaller
-    #     base_path = os.path.dirname(sys.executable)
-    # else:
-    #     base_path = os.path.dirname(os.path.abspath(__file__))
-    #
-    # driver_dir = os.path.join(base_path, "drivers")
-    # os.makedirs(driver_dir, exist_ok=True)
-    #
-    # driver_path = os.path.join(driver_dir, "chromedriver.exe")
-    #
-    # if not os.path.exists(driver_path):
-    #     chrome_version = get_chrome_version()
-    #     if not chrome_version:
-    #         raise RuntimeError("Не удалось определить версию Chrome")
-    #     download_chromedriver(chrome_version, driver_dir)
-
-    # service = Service(driver_path)
-    options = Options()
-    options.add_argument("--start-maximized")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    # chrome_options.add_argument("--headless=new")  # GUI is needed for captcha; leave commented
-    # return webdriver.Chrome(service=service, options=options)
-    return webdriver.Chrome(options=options)
-
-@dataclass
-class Cabinet:
-    business_id: str 
-    name: str
-    dashboard_href: str  # /business/{id}/dashboard?view=marketplace
-
-class Storage:
-    def __init__(self, path: str = DB_FILE):
-        self.conn = sqlite3.connect(path, check_same_thread=False)
-        self._init_schema()
-        self.lock = threading.Lock()
-
-    def _init_schema(self):
-        cur = self.conn.cursor()
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS processed (
-                campaign_id TEXT NOT NULL,
-                sku TEXT NOT NULL,
-                processed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                PRIMARY KEY (campaign_id, sku)
-            )
-            """
-        )
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS cabinets (
-                business_id TEXT PRIMARY KEY,
-                name TEXT,
-                dashboard_href TEXT
-            )
-            """
-        )
-        self.conn.commit()
+from config import (
+    API_MODE, CLOSE_WAIT_SEC, LOG_FILE, LOG_FILE_BACKUPS, LOG_FILE_MAX_BYTES, LOG_FLUSH_INTERVAL_MS, LOG_VIEW_MAX_LINES,
+    PERF_PROFILE, PHASE_TITLES, POOL_MAX_SIZE, PREFETCH_MAX_DEPTH,
+    SKU_STATUS_DEFERRED, SKU_STATUS_DONE, SKU_STATUS_FAILED, SKU_STATUS_PENDING, SKU_STATUS_SKIPPED,
+)
+from parser import XlsxHeader, load_xlsx_skus
+from storage import Cabinet, Storage
 
-    def add_processed(self, campaign_id: str, sku: str):
-        with self.lock:
-            self.conn.execute(
-                "INSERT OR IGNORE INTO processed (campaign_id, sku) VALUES (?, ?)",
-                (campaign_id, sku),
-            )
-            self.conn.commit()
-
-    def is_processed(self, campaign_id: str, sku: str) -> bool:
-        with self.lock:
-            row = self.conn.execute(
-                "SELECT 1 FROM processed WHERE campaign_id=? AND sku=?",
-                (campaign_id, sku),
-            ).fetchone()
-            return row is not None
-
-    def bulk_mark_processed(self, campaign_id: str, skus: List[str]):
-        with self.lock:
-            self.conn.executemany(
-                "INSERT OR IGNORE INTO processed (campaign_id, sku) VALUES (?, ?)",
-                [(campaign_id, s) for s in skus],
-            )
-            self.conn.commit()
+if TYPE_CHECKING:
+    from browser import YandexMarketPhotoReloaderDriver
 
-    def save_cabinets(self, cabinets: List[Cabinet]):
-        with self.lock:
-            self.conn.executemany(
-                "INSERT OR REPLACE INTO cabinets (business_id, name, dashboard_href) VALUES (?, ?, ?)",
-                [(c.business_id, c.name, c.dashboard_href) for c in cabinets],
-            )
-            self.conn.commit()
 
-    def load_cabinets(self) -> List[Cabinet]:
-        with self.lock:
-            rows = self.conn.execute(
-                "SELECT business_id, name, dashboard_href FROM cabinets"
-            ).fetchall()
-        return [Cabinet(*r) for r in rows]
+def _file_logger() -> logging.Logger:
+    """Полный лог работы в ротируемый файл рядом с программой"""
+    logger = logging.getLogger("yandex_partner_reuploader")
+    if not logger.handlers:
+        handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
 
 
 # ======================
-# Selenium driver wrapper
+# Worker threads for long tasks
 # ======================
-class YandexMarketPhotoReloaderDriver:
-    def __init__(self, log_fn):
-        self.driver = None
-        self.actions = None
-        self.wait: Optional[WebDriverWait] = None
-        self.log = log_fn
-
-    def start(self):
-        self.driver = get_driver()
-        self.actions = ActionChains(self.driver)
-        self.wait = WebDriverWait(self.driver, DEFAULT_WAIT)
-        self.log("Браузер запущен")
-
-    def stop(self):
-        if self.driver:
-            try:
-                self.driver.quit()
-            except Exception:
-                pass
-            self.driver = None
-            self.log("Браузер остановлен")
-
-    # -------------
-    # Auth & Cookies
-    # -------------
-    def open_home(self):
-        self.driver.get("https://partner.market.yandex.ru/")
-
-    def save_cookies(self):
-        try:
-            cookies = self.driver.get_cookies()
-            with open(COOKIES_FILE, "wb") as f:
-                pickle.dump(cookies, f)
-            self.log("Cookies сохранены")
-        except Exception as e:
-            self.log(f"Не удалось сохранить cookies: {e}")
-
-    def load_cookies(self):
-        if not os.path.exists(COOKIES_FILE):
-            self.log("Файл cookies не найден — авторизуйтесь вручную")
-            return False
-        try:
-            self.driver.get("https://partner.market.yandex.ru/")
-            with open(COOKIES_FILE, "rb") as f:
-                cookies = pickle.load(f)
-            for c in cookies:
-                # Selenium may require domain without leading dot
-                c = c.copy()
-                c.pop("sameSite", None)  # some drivers dislike this flag
-                try:
-                    self.driver.add_cookie(c)
-                except Exception:
-                    pass
-            self.driver.refresh()
-            self.log("Cookies загружены")
-            return True
-        except Exception as e:
-            self.log(f"Ошибка загрузки cookies: {e}")
-            return False
-
-    # -------------
-    # Helpers
-    # -------------
-    def _is_captcha(self) -> bool:
-        try:
-            html = self.driver.page_source.lower()
-            if "captcha" in html:
-                return True
-        except Exception:
-            return False
-        return False
-
-    def ensure_no_captcha(self):
-        if self._is_captcha():
-            raise RuntimeError("Обнаружена капча. Пожалуйста, решите её в открытом браузере и нажмите Продолжить.")
-
-    @staticmethod
-    def extract_ints(text: str) -> Optional[str]:
-        m = re.search(r"(\d+)", text or "")
-        return m.group(1) if m else None
-
-    # -------------
-    # Cabinets scraping from settings page
-    # -------------
-    def open_business_settings(self, business_id: str):
-        url = f"https://partner.market.yandex.ru/business/{business_id}/settings?activeTab=all"
-        self.driver.get(url)
-        self.wait.until(lambda d: "settings" in d.current_url)
-        self.ensure_no_captcha()
-        self.log(f"Открыта страница настроек бизнеса {business_id}")
-
-    def scrape_cabinets_from_current_page(self) -> List[Cabinet]:
-        try:
-            self.driver.get("https://partner.market.yandex.ru/main-redirect")
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "div[data-e2e='business-list']"))
-            )
-        except TimeoutException:
-            tabs = self.driver.window_handles
-            self.driver.switch_to.window(tabs[-1])
-            self.ensure_no_captcha()
-            self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div[data-e2e='business-list']")))
-
-        cards = self.driver.find_elements(By.CSS_SELECTOR, "div[data-e2e='business-card-wrapper']")
-        cabinets: List[Cabinet] = []
-
-        for card in cards:
-            text = card.text
-            business_id = None
-            name = None
-
-            # --- ID ---
-            try:
-                bid_el = card.find_element(By.CSS_SELECTOR, "[data-e2e='business-id']")
-                business_id = bid_el.text.strip()
-            except Exception:
-                match = re.search(r"\bID(?:\s+\S+)*\s+(\d+)\b", text, re.IGNORECASE)
-                if match:
-                    business_id = match.group(1)
-
-            # --- Name ---
-            try:
-                name_el = card.find_element(By.CSS_SELECTOR, "span[data-e2e='business-card-name']")
-                name = name_el.text.strip()
-            except Exception:
-                text_lines = [line.strip() for line in text.splitlines() if line.strip()]
-                if text_lines:
-                    # если первая строка содержит ID — убираем его
-                    if business_id and business_id in text_lines[0]:
-                        name = " ".join([w for w in text_lines[0].split() if business_id not in w])
-                    else:
-                        name = text_lines[0]
-                else:
-                    name = f"Бизнес {business_id or '?'}"
-
-            # --- Ссылка в кабинет ---
-            dashboard_link = ""
-            if business_id:
-                try:
-                    link_el = self.driver.find_element(
-                        By.XPATH, f"//a[contains(@href,'/business/{business_id}/dashboard')]"
-                    )
-                    dashboard_link = link_el.get_attribute("href")
-                except Exception:
-                    try:
-                        link_el2 = card.find_element(
-                            By.XPATH, ".//following::a[contains(@href,'/business/') and contains(@href,'/dashboard')][1]"
-                        )
-                        dashboard_link = link_el2.get_attribute("href")
-                    except Exception:
-                        dashboard_link = ""
-
-            cabinets.append(Cabinet(business_id=business_id, name=name, dashboard_href=dashboard_link))
-
-        if not cabinets:
-            self.log("Не найдено ни одного кабинета на странице — проверьте, верная ли страница.")
-        else:
-            self.log(f"Найдено кабинетов: {len(cabinets)}")
-
-        return cabinets
-
-
-    def get_campaign_id_from_business(self, business_id: str) -> Optional[str]:
-        # Откроем страницу, где есть ссылка /business/{id}/showcase?campaignId=...
-        url = f"https://partner.market.yandex.ru/business/{business_id}"
-        self.driver.get(url)
-        try:
-            self.wait.until(EC.presence_of_element_located((By.XPATH, f"//a[contains(@href,'/business/{business_id}/showcase') and contains(@href,'campaignId=')]")))
-        except TimeoutException:
-            # иногда ссылка доступна из меню/переключения — попробуем перейти в разделы
-            pass
-
-        self.ensure_no_captcha()
-        links = self.driver.find_elements(By.XPATH, f"//a[contains(@href,'/business/{business_id}/showcase') and contains(@href,'campaignId=')]")
-        if not links:
-            # Возможно, ссылка доступна из меню. Попробуем искать глобально
-            links = self.driver.find_elements(By.XPATH, "//a[contains(@href,'/showcase?campaignId=')]")
-        for a in links:
-            href = a.get_attribute("href")
-            m = re.search(r"campaignId=(\d+)", href or "")
-            if m:
-                cid = m.group(1)
-                self.log(f"Найден campaignId: {cid}")
-                return cid
-        self.log("Не удалось найти campaignId для выбранного кабинета")
-        return None
-
-    # -------------
-    # Offer page -> open picture modal -> download last image -> upload back -> save
-    # -------------
-    def _requests_session_with_cookies(self) -> requests.Session:
-        s = requests.Session()
-        for c in self.driver.get_cookies():
-            try:
-                s.cookies.set(c.get('name'), c.get('value'), domain=c.get('domain'), path=c.get('path'))
-            except Exception:
-                # fallback without domain/path
-                s.cookies.set(c.get('name'), c.get('value'))
-        return s
-
-    def _download_image(self, url: str, dest_path: str):
-        # url может быть //avatars.mds.yandex.net/...
-        if url.startswith("//"):
-            url = "https:" + url
-        sess = self._requests_session_with_cookies()
-        r = sess.get(url, timeout=60)
-        r.raise_for_status()
-        with open(dest_path, "wb") as f:
-            f.write(r.content)
-
-    def process_sku(self, campaign_id: str, sku: str, logger) -> bool:
-        self.ensure_no_captcha()
-        offer_url = f"https://partner.market.yandex.ru/supplier/{campaign_id}/assortment/offer-card?article={requests.utils.quote(sku)}&source=businessStocks"
-        self.driver.get(offer_url)
-
-        try:
-            # Ждем превью картинок
-            self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "img.styles-picture___6gWHl")))
-        except TimeoutException:
-            logger(f"[{sku}] Нет превью изображений на карточке")
-            self.ensure_no_captcha()
-            return False
-
-        self.ensure_no_captcha()
-
-        attempts = 0
-        success = False
-        while attempts < RETRY_COUNT and not success:
-            attempts += 1
-            # Клик по первому превью
-            try:
-                first_thumb_fake = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "img.styles-picture___6gWHl")))
-                first_thumb_real = self.driver.find_elements(By.CSS_SELECTOR, "span.styles-layout___1YRjC")[0]
-                self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", first_thumb_fake)
-                
-                # Навести мышь на элемент
-                self.actions.move_to_element(first_thumb_fake).click().perform()
-                # first_thumb_real.click()
-            except Exception as e:
-                logger(f"[{sku}] Не удалось кликнуть превью: {e}")
-                self.ensure_no_captcha()
-
-            # Ждем модалку
-            try:
-                modal = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.___wrapper___7pLKs.style-picturesDrawer___55UwA")))
-                success = True
-            except TimeoutException:
-                logger(f"[{sku}] Модальное окно с картинками не открылось")
-                self.ensure_no_captcha()
-            if not success:
-                 logger(f"[{sku}] Модальное окно с картинками не открылось")
-                 return False
-
-        # Найти все большие изображения в модалке, взять последнее
-        try:
-            self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "img[data-testid='loaded-image']")))
-            big_images = modal.find_elements(By.CSS_SELECTOR, "img.style-root___17qgj.style-main___6BATS")
-            if not big_images:
-                logger(f"[{sku}] Не найдено больших изображений в модалке")
-                return False
-            last_img = big_images[-1]
-            src = last_img.get_attribute("src")
-            if not src:
-                logger(f"[{sku}] Не удалось получить src последнего изображения")
-                return False
-        except Exception as e:
-            logger(f"[{sku}] Ошибка получения изображения: {e}")
-            return False
+class ProcessWorker(QtCore.QThread):
+    """QThread-обёртка над BatchRunner для GUI: колбэки превращаются в сигналы"""
+    log_signal = QtCore.pyqtSignal(str)
+    progress_signal = QtCore.pyqtSignal(int, int)
+    finished_signal = QtCore.pyqtSignal()
+    captcha_signal = QtCore.pyqtSignal(str)
+    session_signal = QtCore.pyqtSignal(int, int, str)  # номер сессии, обработано ею, текущий статус
+    status_signal = QtCore.pyqtSignal(list, str)  # SKU, SKU_STATUS_*
+    stats_signal = QtCore.pyqtSignal(float, float, dict)  # SKU/мин, ETA в секундах (-1 — неизвестно), среднее по этапам
 
-        # Скачиваем во временный файл
-        tmp_dir = tempfile.mkdtemp(prefix="ym_images_")
-        tmp_path = os.path.join(tmp_dir, "orig.webp")
-        try:
-            self._download_image(src, tmp_path)
-            logger(f"[{sku}] Изображение скачано: {tmp_path}")
-        except Exception as e:
-            logger(f"[{sku}] Не удалось скачать изображение: {e}")
-            return False
+    def __init__(self, driver: "YandexMarketPhotoReloaderDriver", storage: Storage, campaign_id: str, skus: List[str],
+                 skip_processed: bool, pool_size: int = 1, prefetch_depth: int = 0, self_check: bool = True):
+        super().__init__()
+        from runner import BatchRunner
+
+        self.runner = BatchRunner(
+            driver, storage, campaign_id, skus, skip_processed,
+            pool_size=pool_size,
+            prefetch_depth=prefetch_depth,
+            self_check=self_check,
+            log_fn=self.log_signal.emit,
+            progress_fn=self.progress_signal.emit,
+            captcha_fn=self.captcha_signal.emit,
+            session_fn=self.session_signal.emit,
+            status_fn=self.status_signal.emit,
+            stats_fn=self._emit_stats,
+        )
 
-        # Нажимаем на первый элемент <span class="___content___2ml2l"> в модалке
-        try:
-            upload_trigger = self.driver.find_elements(By.CSS_SELECTOR, "span.___content___2ml2l")[0]
-            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", upload_trigger)
-            # upload_trigger.click()
-        except Exception as e:
-            logger(f"[{sku}] Не удалось кликнуть кнопку загрузки: {e}")
-            return False
+    def _emit_stats(self, stats, remaining: int):
+        eta = stats.eta_seconds(remaining)
+        self.stats_signal.emit(stats.rate_per_min(), -1.0 if eta is None else eta, stats.phase_averages())
 
-        # Ищем input[type=file] и отправляем файл
+    def run(self):
         try:
-            # file_input = self.wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "input[type='file']:nth-of-type(2)")))
-           
-            file_inputs = self.wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "input[type='file']")))
-            if len(file_inputs) >= 2:
-                file_input = file_inputs[1]  # второй элемент (индекс 1)
-            else:
-                raise Exception("Недостаточно file input элементов")
-
-            file_input.send_keys(tmp_path)
-            logger(f"[{sku}] Файл отправлен на загрузку")
-        except TimeoutException:
-            logger(f"[{sku}] Не найден input[type=file] для загрузки")
-            return False
+            self.runner.run()
         except Exception as e:
-            logger(f"[{sku}] Ошибка отправки файла: {e}")
-            return False
-
-        # Подождать завершения загрузки — эвристика: ждём исчезновение индикаторов прогресса или появление превью
-        time.sleep(2)
-        self.ensure_no_captcha()
+            self.log_signal.emit(f"Обработка прервана ошибкой: {e}")
+        finally:
+            # иначе кнопки «Запустить»/«Прервать» так и останутся в состоянии «идёт обработка»
+            self.finished_signal.emit()
 
-        # Закрыть модалку
-        try:
-            close_btn = self.driver.find_element(By.XPATH, "//span[@aria-label='Закрыть']")
-            self.driver.execute_script("arguments[0].click();", close_btn)
-        except Exception:
-            # не критично — попробуем дальше
-            pass
+    def resume_after_captcha(self):
+        self.runner.resume_after_captcha()
 
-        # Сохранить изменения
-        try:
-            save_btn = self.wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-e2e='next-step-button']")))
-            self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", save_btn)
-            save_btn.click()
-        except TimeoutException:
-            logger(f"[{sku}] Кнопка Сохранить не найдена")
-            return False
-        except Exception as e:
-            logger(f"[{sku}] Ошибка клика по Сохранить: {e}")
-            return False
+    def abort(self):
+        self.runner.abort()
 
-        # Подождать подтверждения — эвристика: дождёмся некоего уведомления или просто пауза
-        time.sleep(2)
-        self.ensure_no_captcha()
-        logger(f"[{sku}] Сохранение инициировано (ожидаем успешный ответ)")
-        return True
 
+class XlsxLoadWorker(QtCore.QThread):
+    """Фоновый разбор XLSX: SKU приходят пачками, разбор можно отменить.
 
-# ======================
-# Worker thread for long tasks
-# ======================
-class ProcessWorker(QtCore.QThread):
-    log_signal = QtCore.pyqtSignal(str)
+    Если ID кабинета в файле не совпал с expected_business_id, разбор после шапки
+    ждёт ответа answer() на confirm_signal — до него не приходит ни одной пачки.
+    """
+    header_signal = QtCore.pyqtSignal(object)  # XlsxHeader
+    confirm_signal = QtCore.pyqtSignal(str)  # ID кабинета из файла
+    batch_signal = QtCore.pyqtSignal(list)
     progress_signal = QtCore.pyqtSignal(int, int)
-    finished_signal = QtCore.pyqtSignal()
-    captcha_signal = QtCore.pyqtSignal(str)
+    failed_signal = QtCore.pyqtSignal(str)
+    log_signal = QtCore.pyqtSignal(str)
+    finished_signal = QtCore.pyqtSignal(int, bool)  # всего SKU, отменено
 
-    def __init__(self, driver: YandexMarketPhotoReloaderDriver, storage: Storage, campaign_id: str, skus: List[str], skip_processed: bool):
+    def __init__(self, path: str, storage: Optional["Storage"] = None, expected_business_id: Optional[str] = None):
         super().__init__()
-        self.driver = driver
+        self.path = path
         self.storage = storage
-        self.campaign_id = campaign_id
-        self.skus = skus
-        self.skip_processed = skip_processed
-        self._pause_for_captcha = False
+        self.expected_business_id = expected_business_id
+        self.from_cache = False
         self._abort = False
+        self._answered = threading.Event()
 
     def run(self):
-        total = len(self.skus)
-        for idx, sku in enumerate(self.skus, start=1):
-            if self._abort:
-                break
-
-            # Пропуск уже обработанных
-            if self.skip_processed and self.storage.is_processed(self.campaign_id, sku):
-                self.log_signal.emit(f"Пропуск {sku} — уже обработан ранее")
-                self.progress_signal.emit(idx, total)
-                continue
-
-            attempts = 0
-            success = False
-            while attempts < RETRY_COUNT and not success and not self._abort:
-                attempts += 1
-                try:
-                    # Проверка капчи заранее
-                    if self.driver._is_captcha():
-                        self.captcha_signal.emit("Обнаружена капча. Решите её в открытом браузере и нажмите 'Продолжить'.")
-                        # Ожидание разблокировки
-                        while self._pause_for_captcha and not self._abort:
-                            time.sleep(0.5)
-
-                    self.log_signal.emit(f"[{sku}] Попытка {attempts}/{RETRY_COUNT}")
-                    success = self.driver.process_sku(self.campaign_id, sku, self.log_signal.emit)
-                    if not success:
-                        time.sleep(RETRY_DELAY)
-                except RuntimeError as e:
-                    # капча
-                    self.captcha_signal.emit(str(e))
-                    while self._pause_for_captcha and not self._abort:
-                        time.sleep(0.5)
-                except Exception as e:
-                    self.log_signal.emit(f"[{sku}] Ошибка: {e}")
-                    time.sleep(RETRY_DELAY)
-
-            if success:
-                self.storage.add_processed(self.campaign_id, sku)
-                self.log_signal.emit(f"[{sku}] УСПЕХ — отмечен как обработанный")
-            else:
-                self.log_signal.emit(f"[{sku}] НЕ УДАЛОСЬ обработать после {RETRY_COUNT} попыток")
+        try:
+            _, skus, self.from_cache = load_xlsx_skus(
+                self.path, self.storage,
+                on_header=self._on_header,
+                on_batch=self.batch_signal.emit,
+                on_progress=self.progress_signal.emit,
+                log_fn=self.log_signal.emit,
+                is_cancelled=self.is_cancelled,
+            )
+        except Exception as e:
+            self.failed_signal.emit(f"Не удалось прочитать файл Excel: {e}")
+            return
+        self.finished_signal.emit(len(skus), self._abort)
+
+    def _on_header(self, header: XlsxHeader):
+        self.header_signal.emit(header)
+        reported = header.business_id
+        if self.expected_business_id and reported and reported != self.expected_business_id:
+            self.confirm_signal.emit(reported)
+            self._answered.wait()
+
+    def answer(self, proceed: bool):
+        """Ответ на confirm_signal: продолжить разбор или отменить его"""
+        if not proceed:
+            self._abort = True
+        self._answered.set()
+
+    def cancel(self):
+        self._abort = True
+        self._answered.set()
 
-            self.progress_signal.emit(idx, total)
+    def is_cancelled(self) -> bool:
+        return self._abort
 
-        self.finished_signal.emit()
 
-    def pause_for_captcha(self):
-        self._pause_for_captcha = True
+# ======================
+# SKU list model
+# ======================
+class SkuListModel(QtCore.QAbstractListModel):
+    """Список SKU поверх обычного Python-списка: виджет рисует только видимые строки"""
+
+    STATUS_COLORS = {
+        SKU_STATUS_SKIPPED: QtGui.QColor(235, 235, 235),
+        SKU_STATUS_DONE: QtGui.QColor(210, 240, 210),
+        SKU_STATUS_DEFERRED: QtGui.QColor(250, 240, 200),
+        SKU_STATUS_FAILED: QtGui.QColor(250, 210, 210),
+    }
+    STATUS_TITLES = {
+        SKU_STATUS_PENDING: "ожидает",
+        SKU_STATUS_SKIPPED: "пропущен (обработан ранее)",
+        SKU_STATUS_DONE: "обработан",
+        SKU_STATUS_DEFERRED: "отложен, будет повторён",
+        SKU_STATUS_FAILED: "не удалось",
+    }
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._skus: List[str] = []
+        self._status: List[str] = []
+        self._rows: Dict[str, int] = {}
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._skus)
+
+    def data(self, index: QtCore.QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return self._skus[row]
+        if role == Qt.BackgroundRole:
+            color = self.STATUS_COLORS.get(self._status[row])
+            return QtGui.QBrush(color) if color else None
+        if role == Qt.ToolTipRole:
+            return self.STATUS_TITLES.get(self._status[row])
+        return None
 
-    def resume_after_captcha(self):
-        self._pause_for_captcha = False
+    def append_skus(self, skus: List[str]):
+        if not skus:
+            return
+        first = len(self._skus)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(skus) - 1)
+        self._skus.extend(skus)
+        self._status.extend([SKU_STATUS_PENDING] * len(skus))
+        for row, sku in enumerate(skus, start=first):
+            self._rows.setdefault(sku, row)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._skus = []
+        self._status = []
+        self._rows = {}
+        self.endResetModel()
+
+    def skus(self) -> List[str]:
+        """Копия списка SKU для обработчика (виджеты при этом не трогаются)"""
+        return list(self._skus)
+
+    def set_status(self, skus: List[str], status: str):
+        rows = [self._rows[s] for s in skus if s in self._rows]
+        if not rows:
+            return
+        for row in rows:
+            self._status[row] = status
+        self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [Qt.BackgroundRole, Qt.ToolTipRole])
 
-    def abort(self):
-        self._abort = True
+    def reset_statuses(self):
+        if not self._status:
+            return
+        self._status = [SKU_STATUS_PENDING] * len(self._skus)
+        self.dataChanged.emit(self.index(0), self.index(len(self._skus) - 1), [Qt.BackgroundRole, Qt.ToolTipRole])
 
 
 # ======================
@@ -611,9 +238,17 @@ class MainWindow(QtWidgets.QMainWindow):
             Qt.Tool                   # Поведение как инструмент
         )
 
+        # log() может вызываться и из рабочих потоков (лог драйвера), deque.append потокобезопасен
+        self._log_buffer: "collections.deque[str]" = collections.deque()
+        self._file_log = _file_logger()
+
         self.storage = Storage()
-        self.driver = YandexMarketPhotoReloaderDriver(self.log)
+        # selenium импортируется при первом запуске браузера, а не при старте окна
+        self.driver: Optional["YandexMarketPhotoReloaderDriver"] = None
         self.worker: Optional[ProcessWorker] = None
+        self.xlsx_loader: Optional[XlsxLoadWorker] = None
+        self._xlsx_selected_business_id: Optional[str] = None
+        self._xlsx_reported_business_id: Optional[str] = None
         self.campaign_id: Optional[str] = None
         self.current_business_id: Optional[str] = None
 
@@ -648,6 +283,22 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_load_cookies.setEnabled(False)
         top_bar.addWidget(self.btn_load_cookies)
 
+        self.chk_api_mode = QtWidgets.QCheckBox("API-режим (экспериментально)")
+        self.chk_api_mode.setChecked(API_MODE)
+        self.chk_api_mode.setToolTip(
+            "Выучить запросы загрузки и сохранения на первых SKU и дальше повторять их без интерфейса; "
+            "при неудаче SKU проходит через интерфейс. Включается до запуска браузера"
+        )
+        top_bar.addWidget(self.chk_api_mode)
+
+        self.chk_perf_profile = QtWidgets.QCheckBox("Облегчённые страницы")
+        self.chk_perf_profile.setChecked(PERF_PROFILE)
+        self.chk_perf_profile.setToolTip(
+            "Не загружать счётчики, шрифты и оформление кабинета и не ждать полной загрузки страницы; "
+            "фото товаров загружаются как обычно. Включается до запуска браузера"
+        )
+        top_bar.addWidget(self.chk_perf_profile)
+
         layout.addLayout(top_bar)
 
         # Business controls
@@ -687,10 +338,42 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_load_xlsx.clicked.connect(self.on_load_xlsx)
         self.btn_load_xlsx.setEnabled(False)
 
+        self.btn_cancel_xlsx = QtWidgets.QPushButton("Отменить загрузку")
+        self.btn_cancel_xlsx.clicked.connect(self.on_cancel_xlsx)
+        self.btn_cancel_xlsx.setEnabled(False)
+
         self.chk_skip_processed = QtWidgets.QCheckBox("Пропускать уже обработанные")
         self.chk_skip_processed.setChecked(True)
 
-        self.list_skus = QtWidgets.QListWidget()
+        self.spin_pool_size = QtWidgets.QSpinBox()
+        self.spin_pool_size.setRange(1, POOL_MAX_SIZE)
+        self.spin_pool_size.setValue(1)
+        self.spin_pool_size.setPrefix("Браузеров: ")
+
+        self.spin_prefetch = QtWidgets.QSpinBox()
+        self.spin_prefetch.setRange(0, PREFETCH_MAX_DEPTH)
+        self.spin_prefetch.setValue(0)
+        self.spin_prefetch.setPrefix("Предзагрузка картинок, SKU вперёд: ")
+        self.spin_prefetch.setToolTip("0 — выключено; иначе отдельный браузер заранее скачивает картинки следующих SKU")
+
+        self.chk_self_check = QtWidgets.QCheckBox("Проверять селекторы перед запуском")
+        self.chk_self_check.setChecked(True)
+        self.chk_self_check.setToolTip("Открыть первую карточку и убедиться, что кнопки и картинки находятся, до начала обработки")
+
+        self.sku_model = SkuListModel(self)
+        self.sku_filter_model = QtCore.QSortFilterProxyModel(self)
+        self.sku_filter_model.setSourceModel(self.sku_model)
+        self.sku_filter_model.setFilterCaseSensitivity(Qt.CaseInsensitive)
+
+        self.edit_sku_filter = QtWidgets.QLineEdit()
+        self.edit_sku_filter.setPlaceholderText("Поиск SKU")
+        self.edit_sku_filter.setClearButtonEnabled(True)
+        self.edit_sku_filter.textChanged.connect(self.sku_filter_model.setFilterFixedString)
+
+        self.list_skus = QtWidgets.QListView()
+        self.list_skus.setModel(self.sku_filter_model)
+        self.list_skus.setUniformItemSizes(True)
+        self.list_skus.setLayoutMode(QtWidgets.QListView.Batched)
 
         self.btn_start = QtWidgets.QPushButton("Запустить обработку")
         self.btn_start.clicked.connect(self.on_start_processing)
@@ -705,27 +388,60 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btn_continue_after_captcha.setEnabled(False)
 
         self.progress = QtWidgets.QProgressBar()
+        self.lbl_sessions = QtWidgets.QLabel()
+        self.lbl_throughput = QtWidgets.QLabel()
+        self.lbl_phases = QtWidgets.QLabel()
+        self.lbl_phases.setWordWrap(True)
+        self._session_status: Dict[int, str] = {}
 
         proc_layout.addWidget(self.btn_load_xlsx, 0, 0)
-        proc_layout.addWidget(self.chk_skip_processed, 0, 1)
-        proc_layout.addWidget(self.list_skus, 1, 0, 1, 3)
-        proc_layout.addWidget(self.btn_start, 2, 0)
-        proc_layout.addWidget(self.btn_abort, 2, 1)
-        proc_layout.addWidget(self.btn_continue_after_captcha, 2, 2)
-        proc_layout.addWidget(self.progress, 3, 0, 1, 3)
+        proc_layout.addWidget(self.btn_cancel_xlsx, 0, 1)
+        proc_layout.addWidget(self.chk_skip_processed, 0, 2)
+        proc_layout.addWidget(self.edit_sku_filter, 1, 0, 1, 3)
+        proc_layout.addWidget(self.list_skus, 2, 0, 1, 3)
+        proc_layout.addWidget(self.btn_start, 3, 0)
+        proc_layout.addWidget(self.btn_abort, 3, 1)
+        proc_layout.addWidget(self.btn_continue_after_captcha, 3, 2)
+        proc_layout.addWidget(self.progress, 4, 0, 1, 3)
+        proc_layout.addWidget(self.spin_pool_size, 5, 0)
+        proc_layout.addWidget(self.spin_prefetch, 5, 1)
+        proc_layout.addWidget(self.chk_self_check, 5, 2)
+        proc_layout.addWidget(self.lbl_sessions, 6, 0, 1, 3)
+        proc_layout.addWidget(self.lbl_throughput, 7, 0, 1, 3)
+        proc_layout.addWidget(self.lbl_phases, 8, 0, 1, 3)
 
         layout.addWidget(proc_box)
 
         # Log
-        self.log_view = QtWidgets.QTextEdit()
+        self.log_view = QtWidgets.QPlainTextEdit()
         self.log_view.setReadOnly(True)
+        self.log_view.setMaximumBlockCount(LOG_VIEW_MAX_LINES)
         layout.addWidget(self.log_view, stretch=1)
 
+        # Сообщения копятся в буфере и выводятся пачкой по таймеру
+        self._log_timer = QtCore.QTimer(self)
+        self._log_timer.setInterval(LOG_FLUSH_INTERVAL_MS)
+        self._log_timer.timeout.connect(self._flush_log)
+        self._log_timer.start()
+
         # preload saved cabinets
         self._reload_cabinets_combo()
 
     # ---------- Buttons handlers ----------
     def on_start_browser(self):
+        from browser import YandexMarketPhotoReloaderDriver
+        from selenium.common.exceptions import WebDriverException
+
+        if self.driver is None:
+            try:
+                self.driver = YandexMarketPhotoReloaderDriver(self.log, api_mode=self.chk_api_mode.isChecked(),
+                                                              perf_profile=self.chk_perf_profile.isChecked())
+            except ValueError as e:
+                self.log(f"Ошибка в профиле селекторов: {e}")
+                return
+            # сетевой лог и стратегия загрузки задаются при запуске Chrome
+            self.chk_api_mode.setEnabled(False)
+            self.chk_perf_profile.setEnabled(False)
         try:
             self.driver.start()
             self.btn_open_home.setEnabled(True)
@@ -793,11 +509,22 @@ class MainWindow(QtWidgets.QMainWindow):
         if cid:
             self.campaign_id = cid
             self.log(f"Текущий campaignId: {self.campaign_id}")
-            self.btn_start.setEnabled(True)
+            self.btn_start.setEnabled(not self._processing())
         else:
             self.log("Не удалось определить campaignId")
 
+    def _processing(self) -> bool:
+        return bool(self.worker and self.worker.isRunning())
+
     def on_load_xlsx(self):
+        if self.xlsx_loader and self.xlsx_loader.isRunning():
+            self.log("Дождитесь окончания текущей загрузки XLSX или отмените её")
+            return
+        if self._processing():
+            # список SKU и прогресс сейчас принадлежат обработке
+            self.log("Дождитесь окончания обработки или прервите её")
+            return
+
         path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Выберите XLSX", "", "Excel (*.xlsx)")
         if not path:
             return
@@ -814,253 +541,128 @@ class MainWindow(QtWidgets.QMainWindow):
             except Exception:
                 selected_business_id = None
 
-        reported_business_id = None
-        header_row_idx = None
+        self._xlsx_selected_business_id = selected_business_id
+        self._xlsx_reported_business_id = None
+        self.sku_model.clear()
+        self.progress.setMaximum(0)
+        self.progress.setValue(0)
+
+        self.xlsx_loader = XlsxLoadWorker(path, self.storage, expected_business_id=selected_business_id)
+        self.xlsx_loader.header_signal.connect(self.on_xlsx_header)
+        self.xlsx_loader.confirm_signal.connect(self.on_xlsx_confirm)
+        self.xlsx_loader.batch_signal.connect(self.on_xlsx_batch)
+        self.xlsx_loader.progress_signal.connect(self.on_progress)
+        self.xlsx_loader.failed_signal.connect(self.on_xlsx_failed)
+        self.xlsx_loader.log_signal.connect(self.log)
+        self.xlsx_loader.finished_signal.connect(self.on_xlsx_finished)
+        self.xlsx_loader.start()
 
-        try:
-            wb = load_workbook(path, data_only=True, read_only=True)
-            ws = wb.active
-
-            # B3 — ID кабинета в файле (если есть)
-            try:
-                b3 = ws["B3"].value
-                if b3 is not None:
-                    m = re.search(r"(\d+)", str(b3))
-                    if m:
-                        reported_business_id = m.group(1)
-            except Exception:
-                reported_business_id = None
-
-            # Попробуем найти строку заголовков динамически (ищем ячейку с "Ваш SKU")
-            for r in range(1, 30):  # первые ~30 строк
-                row_vals = [str(c.value).strip() if c.value is not None else '' for c in ws[r]]
-                if any('ваш sku' in v.lower() for v in row_vals):
-                    header_row_idx = r
-                    break
+        self.btn_load_xlsx.setEnabled(False)
+        self.btn_cancel_xlsx.setEnabled(True)
+        self.btn_start.setEnabled(False)
+        self.log(f"Загрузка XLSX: {path}")
 
-            # Если не нашли — по умолчанию 7-я строка
-            if header_row_idx is None:
-                header_row_idx = 7
+    def on_xlsx_header(self, header: XlsxHeader):
+        selected_business_id = self._xlsx_selected_business_id
+        reported_business_id = header.business_id
+        self.log(f"Шапка в строке {header.header_row}, колонка SKU: '{header.sku_column_name}'")
 
-        except Exception as e:
-            self.log(f"Не удалось прочитать шапку XLSX через openpyxl: {e}")
-            header_row_idx = 7
-        finally:
-            try:
-                wb.close()
-            except Exception:
-                pass
-
-        # сверка ID кабинета
-        if selected_business_id and reported_business_id and selected_business_id != reported_business_id:
-            reply = QtWidgets.QMessageBox.question(
-                self,
-                "Несовпадение ID кабинета",
-                f"В файле указан ID кабинета: {reported_business_id},\nа выбран кабинет: {selected_business_id}.\n\nПродолжить загрузку?",
-                QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No,
-                QtWidgets.QMessageBox.No,
-            )
-            if reply == QtWidgets.QMessageBox.No:
-                self.log("Загрузка XLSX отменена пользователем из-за несовпадения ID кабинета.")
-                return
-        elif selected_business_id and not reported_business_id:
+        # несовпадение ID кабинета спрашивает on_xlsx_confirm: разбор стоит до ответа
+        if selected_business_id and not reported_business_id:
             self.log("Внимание: не удалось прочитать ID кабинета из ячейки B3. Продолжаем без проверки.")
+        self._xlsx_reported_business_id = reported_business_id
+
+    def on_xlsx_confirm(self, reported_business_id: str):
+        reply = QtWidgets.QMessageBox.question(
+            self,
+            "Несовпадение ID кабинета",
+            f"В файле указан ID кабинета: {reported_business_id},\nа выбран кабинет: {self._xlsx_selected_business_id}.\n\nПродолжить загрузку?",
+            QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No,
+            QtWidgets.QMessageBox.No,
+        )
+        proceed = reply == QtWidgets.QMessageBox.Yes
+        if not proceed:
+            self.log("Загрузка XLSX отменена пользователем из-за несовпадения ID кабинета.")
+        if self.xlsx_loader:
+            self.xlsx_loader.answer(proceed)
+
+    def on_xlsx_batch(self, batch: List[str]):
+        if self.xlsx_loader and self.xlsx_loader.is_cancelled():
+            return
+        self.sku_model.append_skus(batch)
 
-        # Читаем файл через openpyxl, так как pandas плохо работает с объединенными ячейками
-        try:
-            wb = load_workbook(path, data_only=True)
-            ws = wb.active
-            
-            # Функция для получения значения из объединенной ячейки
-            def get_merged_cell_value(row, col):
-                cell = ws.cell(row=row, column=col)
-                if cell.value is not None:
-                    return str(cell.value).strip()
-                
-                # Поиск в объединенных диапазонах
-                for merged_range in ws.merged_cells.ranges:
-                    if merged_range.min_row <= row <= merged_range.max_row and \
-                    merged_range.min_col <= col <= merged_range.max_col:
-                        # Берем значение из верхней левой ячейки объединенного диапазона
-                        top_left_cell = ws.cell(row=merged_range.min_row, column=merged_range.min_col)
-                        return str(top_left_cell.value).strip() if top_left_cell.value is not None else ""
-                return ""
-
-            # Определяем максимальную колонку с данными
-            max_col = 0
-            for row in ws.iter_rows(min_row=header_row_idx, max_row=min(header_row_idx + 50, ws.max_row)):
-                for i, cell in enumerate(row, 1):
-                    if cell.value is not None and str(cell.value).strip():
-                        max_col = max(max_col, i)
-            
-            if max_col == 0:
-                max_col = ws.max_column or 20
-
-            # Собираем заголовки
-            headers = []
-            for col in range(1, max_col + 1):
-                header_val = get_merged_cell_value(header_row_idx, col)
-                if not header_val:
-                    # Пробуем соседние строки
-                    for offset in [-1, 1, 2]:
-                        alt_row = header_row_idx + offset
-                        if alt_row >= 1:
-                            alt_val = get_merged_cell_value(alt_row, col)
-                            if alt_val:
-                                header_val = alt_val
-                                break
-                
-                if not header_val:
-                    header_val = f"Column_{col}"
-                headers.append(header_val)
-
-            # Собираем данные
-            data_rows = []
-            start_data_row = header_row_idx + 1
-            
-            for row_num in range(start_data_row, ws.max_row + 1):
-                row_data = []
-                has_data = False
-                
-                for col in range(1, len(headers) + 1):
-                    cell_val = get_merged_cell_value(row_num, col)
-                    if cell_val and cell_val.lower() != "nan":
-                        has_data = True
-                    row_data.append(cell_val if cell_val else "")
-                
-                if has_data:
-                    data_rows.append(row_data)
-                elif len(data_rows) > 0:
-                    # Если встретили пустую строку после того, как уже были данные,
-                    # проверим еще несколько строк, чтобы убедиться что данные закончились
-                    empty_count = 0
-                    for check_row in range(row_num, min(row_num + 5, ws.max_row + 1)):
-                        check_has_data = False
-                        for check_col in range(1, len(headers) + 1):
-                            check_val = get_merged_cell_value(check_row, check_col)
-                            if check_val and check_val.lower() != "nan":
-                                check_has_data = True
-                                break
-                        if not check_has_data:
-                            empty_count += 1
-                        else:
-                            break
-                    
-                    if empty_count >= 5:  # Если 5 пустых строк подряд - прекращаем
-                        break
-
-            # Создаем DataFrame
-            if data_rows:
-                # Обрезаем заголовки до реального количества колонок в данных
-                max_data_cols = max(len(row) for row in data_rows) if data_rows else 0
-                if max_data_cols < len(headers):
-                    headers = headers[:max_data_cols]
-                elif max_data_cols > len(headers):
-                    # Добавляем недостающие заголовки
-                    for i in range(len(headers), max_data_cols):
-                        headers.append(f"Column_{i + 1}")
-                
-                # Приводим все строки к одинаковой длине
-                for i, row in enumerate(data_rows):
-                    while len(row) < len(headers):
-                        row.append("")
-                    data_rows[i] = row[:len(headers)]
-                
-                df = pd.DataFrame(data_rows, columns=headers)
-            else:
-                df = pd.DataFrame()
-
-        except Exception as e:
-            self.log(f"Ошибка при чтении файла через openpyxl: {e}")
-            # Fallback к pandas
-            try:
-                df = pd.read_excel(path, sheet_name=0, skiprows=header_row_idx - 1, engine="openpyxl")
-            except Exception as e2:
-                self.log(f"Не удалось прочитать файл Excel: {e2}")
-                return
-        finally:
-            try:
-                wb.close()
-            except Exception:
-                pass
+    def on_xlsx_failed(self, msg: str):
+        self.log(msg)
+        self._xlsx_done()
 
-        # Очистка пустых строк/столбцов
-        if not df.empty:
-            df = df.dropna(how="all").dropna(axis=1, how="all")
-        
-        if df.empty:
-            self.log("После очистки данных таблица пуста.")
+    def on_xlsx_finished(self, loaded: int, cancelled: bool):
+        self._xlsx_done()
+        if cancelled:
+            self.sku_model.clear()
+            self.log("Загрузка XLSX отменена")
             return
-
-        # Нормализация имён колонок и поиск колонки SKU
-        def norm(s: str) -> str:
-            return re.sub(r"[^a-zа-я0-9]+", " ", str(s).strip().lower())
-
-        sku_col = None
-        for col in df.columns:
-            nc = norm(col)
-            if nc.startswith("ваш sku") or nc == "sku" or nc == "артикул":
-                sku_col = col
-                break
-
-        if sku_col is None:
-            # запасной поиск
-            SKU_COLUMN_CANDIDATES = ["Ваш SKU", "SKU", "Артикул", "Код товара"]
-            for cand in SKU_COLUMN_CANDIDATES:
-                cand_n = norm(cand)
-                for col in df.columns:
-                    if norm(col).startswith(cand_n):
-                        sku_col = col
-                        break
-                if sku_col:
-                    break
-
-        if sku_col is None:
-            self.log("Не найдена колонка со SKU. Убедитесь, что столбец называется 'Ваш SKU *' или аналогично.")
-            self.log(f"Найденные колонки: {list(df.columns)}")
+        if not loaded:
+            self.log("После очистки данных таблица пуста.")
             return
 
-        # Список SKU
-        series = df[sku_col]
-        skus = [str(x).strip() for x in series.dropna().astype(str).tolist() 
-                if str(x).strip() and str(x).strip().lower() != "nan"]
-
-        # Вывод в UI
-        self.list_skus.clear()
-        for s in skus:
-            self.list_skus.addItem(s)
-
-        msg = f"Загружено SKU: {len(skus)}"
-        if reported_business_id:
-            msg += f" (ID из файла: {reported_business_id})"
-        if selected_business_id:
-            msg += f"; выбран кабинет: {selected_business_id}"
+        msg = f"Загружено SKU: {loaded}"
+        if self.xlsx_loader and self.xlsx_loader.from_cache:
+            msg += " (из кэша)"
+        if self._xlsx_reported_business_id:
+            msg += f" (ID из файла: {self._xlsx_reported_business_id})"
+        if self._xlsx_selected_business_id:
+            msg += f"; выбран кабинет: {self._xlsx_selected_business_id}"
         self.log(msg)
 
+    def _xlsx_done(self):
+        self.progress.setMaximum(1)
+        self.progress.setValue(1)
+        self.btn_load_xlsx.setEnabled(True)
+        self.btn_cancel_xlsx.setEnabled(False)
+        self.btn_start.setEnabled(bool(self.campaign_id) and not self._processing())
+
+    def on_cancel_xlsx(self):
+        if self.xlsx_loader and self.xlsx_loader.isRunning():
+            self.xlsx_loader.cancel()
+            self.log("Запрошена отмена загрузки XLSX")
 
     def on_start_processing(self):
+            if self._processing():
+                return
             if not self.campaign_id:
                 self.log("Сначала получите campaignId для кабинета")
                 return
-            skus = [self.list_skus.item(i).text() for i in range(self.list_skus.count())]
+            skus = self.sku_model.skus()
             if not skus:
                 self.log("Список SKU пуст")
                 return
 
+            self.sku_model.reset_statuses()
             self.worker = ProcessWorker(
                 driver=self.driver,
                 storage=self.storage,
                 campaign_id=self.campaign_id,
                 skus=skus,
                 skip_processed=self.chk_skip_processed.isChecked(),
+                pool_size=self.spin_pool_size.value(),
+                prefetch_depth=self.spin_prefetch.value(),
+                self_check=self.chk_self_check.isChecked(),
             )
+            self._session_status.clear()
+            self.lbl_sessions.clear()
+            self.lbl_throughput.clear()
+            self.lbl_phases.clear()
             self.worker.log_signal.connect(self.log)
+            self.worker.session_signal.connect(self.on_session_status)
+            self.worker.status_signal.connect(self.sku_model.set_status)
             self.worker.progress_signal.connect(self.on_progress)
+            self.worker.stats_signal.connect(self.on_stats)
             self.worker.finished_signal.connect(self.on_finished)
             self.worker.captcha_signal.connect(self.on_captcha)
             self.worker.start()
 
             self.btn_start.setEnabled(False)
+            self.btn_load_xlsx.setEnabled(False)
             self.btn_abort.setEnabled(True)
             self.btn_continue_after_captcha.setEnabled(True)
 
@@ -1078,33 +680,86 @@ class MainWindow(QtWidgets.QMainWindow):
         self.progress.setMaximum(total)
         self.progress.setValue(done)
 
+    def on_session_status(self, session: int, processed: int, status: str):
+        self._session_status[session] = f"#{session}: {status} (готово {processed})"
+        self.lbl_sessions.setText("   ".join(self._session_status[k] for k in sorted(self._session_status)))
+
+    def on_stats(self, rate: float, eta: float, phases: Dict[str, float]):
+        eta_text = f"{int(eta) // 3600}:{int(eta) % 3600 // 60:02d}:{int(eta) % 60:02d}" if eta >= 0 else "—"
+        self.lbl_throughput.setText(f"Скорость: {rate:.1f} SKU/мин   Осталось: ~{eta_text}")
+        total = sum(phases.values())
+        if total > 0:
+            parts = [
+                f"{PHASE_TITLES.get(p, p)} {sec:.1f} с ({sec * 100 / total:.0f}%)"
+                for p, sec in phases.items() if sec >= 0.05
+            ]
+            self.lbl_phases.setText("На SKU в среднем: " + ", ".join(parts))
+
     def on_finished(self):
         self.log("Обработка завершена")
         self.btn_abort.setEnabled(False)
         self.btn_start.setEnabled(True)
+        self.btn_load_xlsx.setEnabled(True)
 
     def on_captcha(self, msg: str):
         self.log(msg)
-        if self.worker:
-            self.worker.pause_for_captcha()
+        # обработка продолжится сама, как только капча будет решена; окно лишь привлекает внимание
+        QtWidgets.QApplication.alert(self)
 
     # ---------- Utils ----------
     def log(self, text: str):
         timestamp = time.strftime("%H:%M:%S")
-        self.log_view.append(f"[{timestamp}] {text}")
-        self.log_view.moveCursor(QtGui.QTextCursor.End)
+        self._log_buffer.append(f"[{timestamp}] {text}")
+        self._file_log.info(text)
+
+    def _flush_log(self):
+        if not self._log_buffer:
+            return
+        lines = []
+        while self._log_buffer:
+            lines.append(self._log_buffer.popleft())
+        # на экран не больше, чем поместится в историю
+        lines = lines[-LOG_VIEW_MAX_LINES:]
+        scrollbar = self.log_view.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 2
+        self.log_view.appendPlainText("\n".join(lines))
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
 
     def closeEvent(self, event: QtGui.QCloseEvent):
+        try:
+            if self.xlsx_loader and self.xlsx_loader.isRunning():
+                self.xlsx_loader.cancel()
+                self.xlsx_loader.wait(2000)
+        except Exception:
+            pass
         try:
             if self.worker and self.worker.isRunning():
                 self.worker.abort()
-                self.worker.wait(2000)
+                # основной браузер закрываем сразу: ожидания загрузки и сохранения в нём оборвутся,
+                # а не дотянут до своих таймаутов
+                if self.driver:
+                    self.driver.stop()
+                if not self.worker.wait(CLOSE_WAIT_SEC * 1000):
+                    self.log(f"Обработка не остановилась за {CLOSE_WAIT_SEC} с — закрываем без ожидания")
         except Exception:
             pass
         try:
-            self.driver.stop()
+            if self.driver:
+                self.driver.stop()
+        except Exception:
+            pass
+        try:
+            if self.worker and self.worker.isRunning():
+                # сессии ещё пишут в хранилище — закрывать его нельзя, сбрасываем накопленное
+                self.storage.flush()
+            else:
+                self.storage.close()
         except Exception:
             pass
+        self._flush_log()
+        for handler in self._file_log.handlers:
+            handler.flush()
         event.accept()
 
 